@@ -53,26 +53,54 @@ def readBalloonParameterList(filename):
 
     @param filename CSV file name of the data
 
-    @return named array with balloon parameters, names are 'weight', 'burst_diameter', 'drag_coefficient'
+    @return dictionary of column arrays with balloon parameters, keys are 'weight', 'burst_diameter', 'drag_coefficient'
     """
-    return np.genfromtxt(filename, delimiter='\t', skip_header=1, names=['weight', 'burst_diameter', 'drag_coefficient'])
+    return parameterColumns(np.genfromtxt(filename, delimiter='\t', skip_header=1, names=['weight', 'burst_diameter', 'drag_coefficient']))
+
+
+def parameterColumns(named_array):
+    """
+    Split a named array into separate contiguous arrays, one per column.
+    Parameter tables are accessed column-wise, which is cheaper on plain
+    arrays than on the fields of a structured array.
+
+    @param named_array parameter table as named array
+
+    @return dictionary of column arrays, keys are the names of the named array
+    """
+    return {name: np.ascontiguousarray(named_array[name]) for name in named_array.dtype.names}
 
 
 def lookupParameters(parameter_list, name, key='weight'):
     """
     Look up parameters for a given name (e.g. balloon weight).
 
-    @param parameter_list parameter table as named array, e.g. as read with readBalloonParameterList
+    @param parameter_list parameter table as dictionary of column arrays, e.g. as read with readBalloonParameterList
     @param name name (e.g. balloon weight) to look up the data
     @param key key to use for look-up (default: weight)
 
-    @return selected column of the named array, or None if the given weight is not in the list.
+    @return dictionary with the parameters of the selected row, or None if the given weight is not in the list.
     """
-    ind = np.where(parameter_list[:][key] == name)[0]
+    ind = np.where(parameter_list[key] == name)[0]
     if len(ind) != 1:
         return None
     else:
-        return parameter_list[ind[0]]
+        return {column: values[ind[0]] for column, values in parameter_list.items()}
+
+
+def parameterIndex(parameter_list, key='weight'):
+    """
+    Build a dictionary index of a parameter table for repeated look-ups.
+
+    @param parameter_list parameter table as dictionary of column arrays, e.g. as read with readBalloonParameterList
+    @param key key to use for look-up (default: weight)
+
+    @return dictionary mapping the values of the key column to the parameters of the respective row
+    """
+    index = {}
+    for ind in range(len(parameter_list[key])):
+        index[parameter_list[key][ind]] = {column: values[ind] for column, values in parameter_list.items()}
+    return index
 
 
 def balloonPerformance(balloon_parameters, payload_weight, launch_volume=None, launch_radius=None, fill_gas=FillGas.HELIUM, burst_height_correction_factor=1.0):
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fast interpolation of gridded model data at single points.
+
+Copyright (C) 2022 Andreas Schneider <andreas.schneider@fmi.fi>
+
+This file is part of Balloon Operator.
+
+Balloon Operator is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later version.
+
+Balloon Operator is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+Balloon Operator. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+import bisect
+import itertools
+
+
+def nearestIndex(axis, x):
+    """
+    Find the grid point nearest to a coordinate on a monotonic axis by binary
+    search. This gives the same result as np.argmin(np.abs(axis-x)), including
+    the choice of the first point in case of a tie, without the temporary arrays.
+
+    @param axis strictly ascending or descending 1-d array of grid coordinates
+    @param x coordinate
+
+    @return ind index of the nearest grid point
+    """
+    n = len(axis)
+    if axis[0] <= axis[-1]:
+        ind = int(np.searchsorted(axis, x)) # first point >= x
+    else:
+        ind = n - int(np.searchsorted(axis[::-1], x, side='right')) # first point <= x
+    if ind <= 0:
+        return 0
+    if ind >= n:
+        return n - 1
+    return ind if abs(axis[ind] - x) < abs(axis[ind-1] - x) else ind - 1
+
+
+class GridInterpolator(object):
+    """
+    Multilinear interpolation on a rectilinear grid, evaluated at one point per call.
+
+    This gives the same results as scipy.interpolate.RegularGridInterpolator
+    with method='linear' and bounds_error=True, but avoids its considerable
+    per-call overhead (input validation, generic n-d machinery), which dominates
+    when a trajectory is integrated one point at a time.
+    """
+
+    def __init__(self, points, values):
+        """
+        Constructor
+
+        @param points tuple of 1-d arrays with the strictly ascending or
+            descending grid coordinates of each dimension
+        @param values array with the data on the grid; it may have trailing
+            dimensions beyond those of the grid, e.g. for vector components
+        """
+        values = np.asarray(values)
+        self.grid = []
+        for ind_dim, axis in enumerate(points):
+            axis = np.asarray(axis, dtype=float)
+            if len(axis) < 2:
+                raise ValueError('There must be at least two points in dimension {}'.format(ind_dim))
+            if axis.shape[0] != values.shape[ind_dim]:
+                raise ValueError('There are {} points and {} values in dimension {}'.format(
+                        axis.shape[0], values.shape[ind_dim], ind_dim))
+            if (np.diff(axis) < 0).all(): # descending axis: flip it together with the data
+                axis = axis[::-1]
+                values = np.flip(values, axis=ind_dim)
+            elif not (np.diff(axis) > 0).all():
+                raise ValueError('The points in dimension {} must be strictly ascending or descending'.format(ind_dim))
+            self.grid.append(axis.tolist()) # lists are fastest for bisect and scalar access
+        self.values = np.ascontiguousarray(values)
+        # Flatten the grid dimensions, so that the corners of a grid cell can be
+        # gathered with one index array of fixed offsets from the lower corner.
+        n_dim = len(self.grid)
+        self.flat_values = self.values.reshape((-1,) + self.values.shape[n_dim:])
+        self.strides = [int(np.prod(self.values.shape[ind_dim+1:n_dim])) for ind_dim in range(n_dim)]
+        self.corner_offsets = np.array([np.dot(corner, self.strides) for corner in itertools.product((0, 1), repeat=n_dim)])
+
+    def locate(self, ind_dim, x):
+        """
+        Find the grid cell containing a coordinate.
+
+        @param ind_dim index of the dimension
+        @param x coordinate
+
+        @return ind index of the lower grid point of the cell
+        @return weight relative position of x within the cell, from 0 to 1
+        """
+        axis = self.grid[ind_dim]
+        if not axis[0] <= x <= axis[-1]:
+            raise ValueError('One of the requested xi is out of bounds in dimension {}'.format(ind_dim))
+        ind = bisect.bisect_right(axis, x) - 1
+        if ind == len(axis) - 1: # upper boundary
+            ind -= 1
+        return ind, (x - axis[ind]) / (axis[ind+1] - axis[ind])
+
+    def locateAll(self, ind_dim, x):
+        """
+        Find the grid cells containing an array of coordinates at once.
+        This can be used to precompute the cells along a dimension whose
+        coordinates are known in advance, e.g. the levels along a trajectory.
+
+        @param ind_dim index of the dimension
+        @param x array of coordinates
+
+        @return ind array of indices of the lower grid points of the cells
+        @return weight array of relative positions of x within the cells
+        """
+        axis = np.array(self.grid[ind_dim])
+        x = np.asarray(x, dtype=float)
+        if (x < axis[0]).any() or (x > axis[-1]).any():
+            raise ValueError('One of the requested xi is out of bounds in dimension {}'.format(ind_dim))
+        ind = np.minimum(np.searchsorted(axis, x, side='right') - 1, len(axis) - 2)
+        return ind, (x - axis[ind]) / (axis[ind+1] - axis[ind])
+
+    def evaluate(self, indices, weights):
+        """
+        Interpolate at a point given by its grid cell in every dimension.
+
+        @param indices index of the lower grid point of the cell, one per dimension
+        @param weights relative position within the cell, one per dimension
+
+        @return value interpolated value, array with the trailing shape of the
+            data (scalar for data without trailing dimensions)
+        """
+        base = sum(ind * stride for ind, stride in zip(indices, self.strides))
+        # Weights of the corners in the order of corner_offsets, first dimension slowest.
+        corner_weights = [1.]
+        for weight in weights:
+            corner_weights = [corner_weight * factor for corner_weight in corner_weights for factor in (1. - weight, weight)]
+        return np.dot(corner_weights, self.flat_values[base + self.corner_offsets])
+
+    def evaluateAll(self, indices, weights):
+        """
+        Interpolate at several points at once, given by their grid cells.
+
+        @param indices index of the lower grid point of the cells, one scalar
+            (same for all points) or array per dimension
+        @param weights relative positions within the cells, one scalar (same
+            for all points) or array per dimension
+
+        @return values interpolated values, array with the points as first
+            dimension followed by the trailing shape of the data
+        """
+        base = np.atleast_1d(sum(np.asarray(ind) * stride for ind, stride in zip(indices, self.strides)))
+        # Weights of the corners in the order of corner_offsets, first dimension slowest.
+        corner_weights = np.ones(1)
+        for weight in weights:
+            factors = np.stack(np.broadcast_arrays(1. - np.asarray(weight, dtype=float), weight), axis=-1)
+            corner_weights = corner_weights[..., :, np.newaxis] * factors[..., np.newaxis, :]
+            corner_weights = corner_weights.reshape(corner_weights.shape[:-2] + (-1,))
+        corner_weights = np.broadcast_to(corner_weights, (len(base), len(self.corner_offsets)))
+        corners = self.flat_values[base[:, np.newaxis] + self.corner_offsets]
+        return np.einsum('pc,pc...->p...', corner_weights, corners)
+
+    def __call__(self, xi):
+        """
+        Interpolate at given point.
+
+        @param xi coordinates of the point, one per grid dimension
+
+        @return value interpolated value, array with the trailing shape of the
+            data (scalar for data without trailing dimensions)
+        """
+        cells = [self.locate(ind_dim, x) for ind_dim, x in enumerate(xi)]
+        return self.evaluate([cell[0] for cell in cells], [cell[1] for cell in cells])
@@ -19,9 +19,11 @@ You should have received a copy of the GNU General Public License along with
 Balloon Operator. If not, see <https://www.gnu.org/licenses/>.
 """
 
+import datetime
 import numpy as np
 import gpxpy
 import gpxpy.gpx
+import xml.sax.saxutils
 import logging
 
 class Message(object):
@@ -146,6 +148,51 @@ class Message(object):
                     msg['LAT'], msg['LON'], elevation=msg['ALT'], time=msg['DATETIME'],
                     comment='{} hPa'.format(msg['PRESS']) if 'PRESS' in msg else None)
 
+    @staticmethod
+    def message2trackpointXml(msg):
+        """
+        Creates the GPX XML element of a trackpoint from a parsed message,
+        equivalent to message2trackpoint, but without creating gpxpy objects.
+    
+        @param msg dictionary with parsed message
+    
+        @return trkpt trkpt element as string
+        """
+        msg_time = msg['DATETIME']
+        if msg_time.tzinfo is None:
+            time_text = msg_time.isoformat()
+        else: # write timezone-aware times in UTC
+            time_text = msg_time.astimezone(datetime.timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+        trkpt = '<trkpt lat="{}" lon="{}">\n<ele>{}</ele>\n<time>{}</time>\n'.format(
+                msg['LAT'], msg['LON'], msg['ALT'], time_text)
+        if 'PRESS' in msg:
+            trkpt += '<cmt>{} hPa</cmt>\n'.format(msg['PRESS'])
+        return trkpt + '</trkpt>\n'
+
+    @staticmethod
+    def messages2gpxXml(messages, name=None):
+        """
+        Creates a GPX document with a track of parsed messages.
+        For a large number of messages, this is much faster than building the
+        track with gpxpy objects and serializing it.
+    
+        @param messages list of parsed messages
+        @param name name of the gpx
+    
+        @return xml GPX document as string
+        """
+        parts = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+                 '<gpx xmlns="http://www.topografix.com/GPX/1/1" '
+                 'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+                 'xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd" '
+                 'version="1.1" creator="Balloon Operator">\n']
+        if name is not None:
+            parts.append('<metadata>\n<name>{}</name>\n</metadata>\n'.format(xml.sax.saxutils.escape(name)))
+        parts.append('<trk>\n<trkseg>\n')
+        parts += [Message.message2trackpointXml(msg) for msg in messages]
+        parts.append('</trkseg>\n</trk>\n</gpx>\n')
+        return ''.join(parts)
+
     @staticmethod
     def message2waypoint(msg, name='Current'):
         """
@@ -23,12 +23,8 @@ from enum import Enum
 import numpy as np
 import datetime
 import struct
-import gpxpy
-import gpxpy.gpx
-import configparser
 import imaplib
 import email
-import requests
 import os.path
 import sys
 import logging
@@ -114,6 +110,55 @@ class TrackerMessageFields(Enum):
     USERFUNC8 = 0x5f  
 
 
+"""
+Layout of the DATETIME field: year, month, day, hour, minute, second.
+"""
+datetime_struct = struct.Struct('<HBBBBB')
+
+"""
+File extensions of SBD message attachments in gateway mails.
+"""
+sbd_file_extensions = frozenset(('.sbd', '.bin'))
+
+
+def fieldParserTable(field_type, field_struct, conversion_factor):
+    """
+    Build a table of field parsers indexed by the raw field ID byte.
+
+    @param field_type dictionary with field types as in MessageSbd.FIELD_TYPE
+    @param field_struct dictionary with structs of scalar fields as in MessageSbd.FIELD_STRUCT
+    @param conversion_factor dictionary with conversion factors as in MessageSbd.CONVERSION_FACTOR
+
+    @return tuple of 256 entries, each either None for an unknown field ID or
+        a tuple (field name, kind, format, length in bytes, conversion factor or None), where kind
+        is one of 'scalar' (format is a struct), 'array' (format is a tuple of
+        dtype and length), 'datetime' (format is a struct), 'bytes' (format is
+        the length in bytes) or 'none' (field without data)
+    """
+    table = [None] * 256
+    for field in TrackerMessageFields:
+        if field == TrackerMessageFields.DATETIME:
+            kind = 'datetime'
+            field_format = datetime_struct
+            field_len = field_format.size
+        elif isinstance(field_type[field], int): # length in bytes
+            kind = 'bytes' if field_type[field] > 0 else 'none'
+            field_format = field_type[field]
+            field_len = field_format
+        elif isinstance(field_type[field], np.dtype): # dtype of scalar
+            kind = 'scalar'
+            field_format = field_struct[field]
+            field_len = field_format.size
+        elif isinstance(field_type[field], tuple): # dtype and length of array
+            kind = 'array'
+            field_format = field_type[field]
+            field_len = field_format[0].itemsize * field_format[1]
+        else:
+            raise ValueError('Unknown entry in FIELD_TYPE list: {}'.format(field_type[field]))
+        table[field.value] = (field.name, kind, field_format, field_len, conversion_factor.get(field))
+    return tuple(table)
+
+
 class MessageSbd(message.Message):
     """
     Communication via Short Burst Data (SBD) with the Artemis Global Tracker
@@ -233,6 +278,21 @@ class MessageSbd(message.Message):
             TrackerMessageFields.LOWBATT: 1e-2
     }
 
+    """
+    Precompiled little-endian structs for the scalar data fields,
+    derived from FIELD_TYPE.
+    """
+    FIELD_STRUCT = {
+            field: struct.Struct('<' + field_type.char)
+            for field, field_type in FIELD_TYPE.items()
+            if isinstance(field_type, np.dtype)
+    }
+
+    """
+    Field parsers indexed by the raw field ID byte, see fieldParserTable.
+    """
+    FIELD_PARSER = fieldParserTable(FIELD_TYPE, FIELD_STRUCT, CONVERSION_FACTOR)
+
     def __init__(self, email_host=None, email_user=None, email_password=None,
                  email_old_ssl=False, email_from='@rockblock.rock7.com',
                  rockblock_user=None, rockblock_password=None):
@@ -248,6 +308,10 @@ class MessageSbd(message.Message):
         self.email_from = email_from
         self.rockblock_user = rockblock_user
         self.rockblock_password = rockblock_password
+        self.rockblock_session = None
+        self.message_layouts = {}
+        self.email_uid_validity = None
+        self.email_last_uid = 0
 
 
     @staticmethod
@@ -255,10 +319,9 @@ class MessageSbd(message.Message):
         """
         Convert ASCII representation of binary message to real binary message.
         """
-        msg = b''
-        for ind in np.arange(0,len(msg_asc),2):
-            msg += np.uint8(int(msg_asc[ind:ind+2], 16))
-        return msg
+        if isinstance(msg_asc, (bytes, bytearray)):
+            msg_asc = msg_asc.decode('ascii')
+        return bytes.fromhex(msg_asc)
     
 
     @staticmethod
@@ -266,10 +329,7 @@ class MessageSbd(message.Message):
         """
         Encode binary message to ASCII representation.
         """
-        msg_asc = ''
-        for ind in range(len(msg_bin)):
-            msg_asc += '{:02x}'.format(msg_bin[ind])
-        return msg_asc
+        return bytes(msg_bin).hex()
 
 
     @staticmethod
@@ -282,13 +342,11 @@ class MessageSbd(message.Message):
         @return cs_a
         @return cs_b
         """
-        old_settings = np.seterr(over='ignore') # Do not warn for desired overflow in this computation.
-        cs_a = np.uint8(0)
-        cs_b = np.uint8(0)
-        for ind in range(len(data)):
-            cs_a += np.uint8(data[ind])
-            cs_b += cs_a
-        np.seterr(**old_settings)
+        values = np.frombuffer(data, dtype=np.uint8).astype(np.uint64)
+        # cs_b sums up all intermediate cs_a, i.e. byte i enters with weight n-i.
+        weights = np.arange(len(values), 0, -1, dtype=np.uint64)
+        cs_a = int(values.sum()) & 0xff
+        cs_b = int(np.dot(weights, values)) & 0xff
         return cs_a, cs_b
 
 
@@ -316,32 +374,35 @@ class MessageSbd(message.Message):
             ind = 5
         assert(msg[ind] == TrackerMessageFields.STX.value)
         ind += 1
-        while (msg[ind] != TrackerMessageFields.ETX.value):
-            field = TrackerMessageFields(msg[ind])
-            ind += 1
-            if isinstance(self.FIELD_TYPE[field], int): # length in bytes
-                field_len = self.FIELD_TYPE[field]
-                if field == TrackerMessageFields.DATETIME:
-                    values = struct.unpack('HBBBBB', msg[ind:ind+field_len])
-                    logging.debug('  DATETIME: {}'.format(values))
-                    data[field.name] = datetime.datetime(*values)
-                elif field_len > 0:
-                    data[field.name] = msg[ind:ind+field_len]
-                else:
-                    data[field.name] = None
-            elif isinstance(self.FIELD_TYPE[field], np.dtype): # dtype of scalar
-                field_len = self.FIELD_TYPE[field].itemsize
-                data[field.name] = np.frombuffer(msg[ind:ind+field_len], dtype=self.FIELD_TYPE[field])[0]
-            elif isinstance(self.FIELD_TYPE[field], tuple): # dtype and length of array
-                field_len = self.FIELD_TYPE[field][0].itemsize * self.FIELD_TYPE[field][1]
-                data[field.name] = np.frombuffer(msg[ind:ind+field_len], dtype=self.FIELD_TYPE[field][0])
+        start = ind
+        field_ids = bytearray()
+        field_parser = self.FIELD_PARSER
+        etx = TrackerMessageFields.ETX.value
+        while (msg[ind] != etx):
+            parser = field_parser[msg[ind]]
+            if parser is None:
+                raise ValueError('{} is not a valid TrackerMessageFields'.format(msg[ind]))
+            field_ids.append(msg[ind])
+            ind += 1 + parser[3]
+        layout_struct, layout_fields = self.messageLayout(bytes(field_ids))
+        values = layout_struct.unpack_from(msg, start)
+        ind_value = 0
+        for name, kind, field_format, n_values, conversion_factor in layout_fields:
+            if kind == 'scalar' or kind == 'bytes':
+                value = values[ind_value]
+            elif kind == 'datetime':
+                logging.debug('  DATETIME: {}'.format(values[ind_value:ind_value+n_values]))
+                value = datetime.datetime(*values[ind_value:ind_value+n_values])
+            elif kind == 'array':
+                value = np.array(values[ind_value:ind_value+n_values], dtype=field_format[0])
             else:
-                raise ValueError('Unknown entry in FIELD_TYPE list: {}'.format(self.FIELD_TYPE[field]))
-            if field in self.CONVERSION_FACTOR:
-                data[field.name] = float(data[field.name]) * self.CONVERSION_FACTOR[field]
-            ind += field_len
+                value = None
+            if conversion_factor is not None:
+                value = float(value) * conversion_factor
+            data[name] = value
+            ind_value += n_values
         ind += 1 # ETX
-        cs_a, cs_b = self.checksum(msg[:ind])
+        cs_a, cs_b = self.checksum(memoryview(msg)[:ind])
         assert (msg[ind] == cs_a), 'Checksum mismatch'
         assert (msg[ind+1] == cs_b), 'Checksum mismatch'
         if imei is not None:
@@ -349,6 +410,44 @@ class MessageSbd(message.Message):
         return data
 
 
+    def messageLayout(self, field_ids):
+        """
+        Get the layout of a message with the given sequence of fields.
+        A tracker usually sends the same fields in every message, therefore
+        layouts are cached.
+
+        @param field_ids field IDs in the order of the message as bytes
+
+        @return layout_struct struct decoding all fields between STX and ETX at once
+        @return layout_fields list of (field name, kind, format, number of values,
+            conversion factor or None), with kind and format as in FIELD_PARSER
+        """
+        layout = self.message_layouts.get(field_ids)
+        if layout is None:
+            layout_format = '<'
+            layout_fields = []
+            for field_id in field_ids:
+                name, kind, field_format, field_len, conversion_factor = self.FIELD_PARSER[field_id]
+                layout_format += 'x' # field ID
+                if kind == 'scalar' or kind == 'datetime':
+                    field_code = field_format.format[1:] # without byte order
+                    n_values = len(field_code)
+                elif kind == 'array':
+                    field_code = '{}{}'.format(field_format[1], field_format[0].char)
+                    n_values = field_format[1]
+                elif kind == 'bytes':
+                    field_code = '{}s'.format(field_len)
+                    n_values = 1
+                else:
+                    field_code = ''
+                    n_values = 0
+                layout_format += field_code
+                layout_fields.append((name, kind, field_format, n_values, conversion_factor))
+            layout = (struct.Struct(layout_format), layout_fields)
+            self.message_layouts[field_ids] = layout
+        return layout
+
+
     def encodeMessage(self, data):
         """
         Create a binary SBD message in Sparkfun Artemis Global Tracker format.
@@ -357,37 +456,36 @@ class MessageSbd(message.Message):
     
         @return msg encoded binary SBD message
         """
-        msg = b''
-        msg += np.uint8(TrackerMessageFields.STX.value)
-        for field in TrackerMessageFields:
-            if field.name in data:
-                msg += np.uint8(field.value)
-                if field == TrackerMessageFields.DATETIME:
-                    msg += struct.pack(
-                            'HBBBBB',
-                            data[field.name].year, data[field.name].month,
-                            data[field.name].day, data[field.name].hour,
-                            data[field.name].minute, data[field.name].second)
-                elif isinstance(self.FIELD_TYPE[field], np.dtype): # dtype of scalar
-                    rawvalue = np.array([ data[field.name] ])
-                    if field in self.CONVERSION_FACTOR:
-                        rawvalue /= self.CONVERSION_FACTOR[field]
-                    msg += rawvalue.astype(self.FIELD_TYPE[field]).tobytes()
-                    del rawvalue
-                elif isinstance(self.FIELD_TYPE[field], tuple): # dtype and length of array
-                    assert(len(data[field.name]) == self.FIELD_TYPE[field][1])
-                    rawdata = np.array(data[field.name])
-                    if field in self.CONVERSION_FACTOR:
-                        rawdata /= self.CONVERSION_FACTOR[field]
-                    msg += rawdata.astype(self.FIELD_TYPE[field]).tobytes()
-                    del rawdata
-                elif isinstance(self.FIELD_TYPE[field], int): # number of bytes
-                    msg += np.zeros(self.FIELD_TYPE[field], dtype=np.uint8).tobytes()
-        msg += np.uint8(TrackerMessageFields.ETX.value)
+        msg = bytearray()
+        msg.append(TrackerMessageFields.STX.value)
+        for field_id, parser in enumerate(self.FIELD_PARSER):
+            if parser is None or parser[0] not in data:
+                continue
+            name, kind, field_format, field_len, conversion_factor = parser
+            value = data[name]
+            msg.append(field_id)
+            if kind == 'scalar':
+                rawvalue = np.array([ value ])
+                if conversion_factor is not None:
+                    rawvalue = rawvalue / conversion_factor
+                msg += rawvalue.astype(field_format.format).tobytes() # dtype of the little-endian struct
+            elif kind == 'datetime':
+                msg += field_format.pack(
+                        value.year, value.month, value.day,
+                        value.hour, value.minute, value.second)
+            elif kind == 'array':
+                assert(len(value) == field_format[1])
+                rawdata = np.array(value)
+                if conversion_factor is not None:
+                    rawdata = rawdata / conversion_factor
+                msg += rawdata.astype(field_format[0]).tobytes()
+            else: # bytes or none
+                msg += bytes(field_len)
+        msg.append(TrackerMessageFields.ETX.value)
         cs_a, cs_b = self.checksum(msg)
-        msg += cs_a
-        msg += cs_b
-        return msg
+        msg.append(cs_a)
+        msg.append(cs_b)
+        return bytes(msg)
 
 
     def connect(self, host=None, user=None, password=None, old_ssl=None):
@@ -411,6 +509,7 @@ class MessageSbd(message.Message):
         self.imap = imaplib.IMAP4_SSL(host if host is not None else self.email_host, ssl_context=ctx) # connect to host using SSL
         self.imap.login(user if user is not None else self.email_user,
                         password if password is not None else self.email_password) # login to server
+        self.email_last_uid = 0 # consider all unseen mails again in a new session
     
     
     def disconnect(self):
@@ -433,9 +532,19 @@ class MessageSbd(message.Message):
         """
         Extract IMEI and SBD message attachment(s) from a given email via IMAP.
         """
-        sbd_list = []
         typ, data = self.imap.fetch(num, '(RFC822)')
-        raw_message = data[0][1]
+        return self.extractSbdData(data[0][1])
+
+
+    def extractSbdData(self, raw_message):
+        """
+        Extract IMEI and SBD message attachment(s) from a raw email.
+
+        @param raw_message email as fetched via IMAP
+
+        @return sbd_list list of SBD attachments, as (IMEI, attachment) tuples if the IMEI is known
+        """
+        sbd_list = []
         if sys.version_info[0] == 2:
             msg = email.message_from_string(raw_message)
         else:
@@ -456,7 +565,7 @@ class MessageSbd(message.Message):
                 filename = part.get_filename()
                 if bool(filename):
                     _, fileext = os.path.splitext(filename)
-                    if fileext in ['.sbd', '.bin']:
+                    if fileext.lower() in sbd_file_extensions:
                         sbd_list.append(part.get_payload(decode=True))
                     else:
                         logging.warning('receiveMessages: unrecognized file extension {} of attachment.'.format(fileext))
@@ -469,6 +578,10 @@ class MessageSbd(message.Message):
     def receiveMessages(self, from_address=None, unseen_only=True, first_only=False):
         """
         Query IMAP server for new mails from IRIDIUM gateway and extract new messages.
+        When only unseen messages are requested, mails up to the highest UID
+        already retrieved since connecting are skipped, even if they have been
+        marked as unseen again meanwhile. Reconnect to retrieve them. The UID
+        cursor is also reset when the UIDVALIDITY of the mailbox changes.
     
         @param from_address sender address to filter for
         @param unseen_only whether to only retrieve unseen messages (default: True)
@@ -482,20 +595,30 @@ class MessageSbd(message.Message):
             from_address = self.email_from
         sbd_list = []
         self.imap.select('Inbox')
+        typ, uid_validity = self.imap.response('UIDVALIDITY')
+        if uid_validity != self.email_uid_validity: # UIDs from earlier polls are meaningless
+            self.email_uid_validity = uid_validity
+            self.email_last_uid = 0
         criteria = ['FROM', from_address]
         if unseen_only:
             criteria.append('(UNSEEN)')
-        retcode, messages = self.imap.search(None, *criteria)
-        matches = messages[0].split()
+            if self.email_last_uid > 0:
+                # Let the server only consider mails that arrived after the last poll.
+                criteria = ['UID', '{}:*'.format(self.email_last_uid+1)] + criteria
+        retcode, messages = self.imap.uid('SEARCH', *criteria)
+        # n:* always matches the highest UID, even if it is below n.
+        matches = [uid for uid in messages[0].split() if int(uid) > self.email_last_uid or not unseen_only]
         if first_only:
-            if len(matches) > 0:
-                return self.extractEmailData(matches[0])
-            else:
-                return []
-        else:
-            for num in matches:
-                sbd_list += self.extractEmailData(num)
-            return sbd_list
+            matches = matches[:1]
+        if len(matches) > 0:
+            # Fetch all mails in one command instead of one round trip per mail.
+            typ, data = self.imap.uid('FETCH', b','.join(matches), '(RFC822)')
+            for item in data:
+                if isinstance(item, tuple): # (envelope, raw message), other items close the response
+                    sbd_list += self.extractSbdData(item[1])
+            if unseen_only:
+                self.email_last_uid = max(int(uid) for uid in matches)
+        return sbd_list
 
 
     def receiveMessage(self, from_address=None):
@@ -509,18 +632,36 @@ class MessageSbd(message.Message):
             return sbd_list[0]
 
 
-    def sendMessage(self, imei, data, user=None, password=None):
+    def sendMessage(self, imei, data, user=None, password=None, data_asc=None):
         """
         Send a mobile terminated (MT) message to a RockBLOCK device.
+
+        @param imei IMEI of the receiving device
+        @param data binary message
+        @param user RockBLOCK user name (default: as given to the constructor)
+        @param password RockBLOCK password (default: as given to the constructor)
+        @param data_asc ASCII representation of the message if already at hand (optional)
         """
+        if data_asc is None:
+            data_asc = self.bin2asc(data)
         if user is None:
             user = self.rockblock_user
         if password is None:
             password = self.rockblock_password
-        resp = requests.post(
-                'https://core.rock7.com/rockblock/MT',
-                data={'imei': imei, 'data': self.bin2asc(data),
-                      'username': user, 'password': password})
+        import requests
+        if self.rockblock_session is None:
+            # Keep the connection alive to save the TLS handshake on further messages.
+            self.rockblock_session = requests.Session()
+        try:
+            resp = self.rockblock_session.post(
+                    'https://core.rock7.com/rockblock/MT',
+                    data={'imei': imei, 'data': data_asc,
+                          'username': user, 'password': password},
+                    timeout=10)
+        except requests.exceptions.RequestException as err:
+            error_message = 'POST command failed: {}'.format(err)
+            logging.error(error_message)
+            return False, error_message
         if not resp.ok:
             print('Error sending message: POST command failed: {}'.format(resp.text))
         parts = resp.text.split(',')
@@ -562,7 +703,8 @@ def retrieveMessages(config_file, all_messges=False, gpx_output_file=None, csv_o
     """
     Retrieve messages and write out data.
     """
-    from balloon_operator import trajectory_predictor, credentials
+    import configparser
+    from balloon_operator import credentials
     config = configparser.ConfigParser()
     config.read(config_file)
     if 'password' in config['email'] and config['email']['password']:
@@ -575,14 +717,12 @@ def retrieveMessages(config_file, all_messges=False, gpx_output_file=None, csv_o
     message_handler.connect()
     messages = message_handler.getDecodedMessages(from_address=config['email'].get('from', fallback='@rockblock.rock7.com'), unseen_only=not all_messges)
     message_handler.disconnect()
-    gpx_segment = gpxpy.gpx.GPXTrackSegment()
     for msg in messages:
         print(msg)
-        gpx_segment.points.append(message_handler.message2trackpoint(msg))
     if gpx_output_file:
-        gpx_track = gpxpy.gpx.GPXTrack()
-        gpx_track.segments.append(gpx_segment)
-        trajectory_predictor.writeGpx(gpx_track, gpx_output_file, name='Artemis Tracker')
+        with open(gpx_output_file, 'w') as fd:
+            logging.info('Writing {}'.format(gpx_output_file))
+            fd.write(message_handler.messages2gpxXml(messages, name='Artemis Tracker'))
     if csv_output_file and len(messages) > 0:
         # Write out last message in CSV format.
         line = '{},{:.7f},{:.7f},{:.1f}'.format(msg['DATETIME'].isoformat(), msg['LON'], msg['LAT'], msg['ALT'])
@@ -602,7 +742,6 @@ def encodeMessage(position=None, time=None, userfunc=None, output_file=None, sen
     Encode binary SBD message corresponding to given data
     and write it to file or send it to mobile IRIDIUM device.
     """
-    from balloon_operator import credentials
     data = {}
     if position is not None:
         data.update({
@@ -615,12 +754,15 @@ def encodeMessage(position=None, time=None, userfunc=None, output_file=None, sen
         data.update(userfunc)
     message_handler = MessageSbd()
     message = message_handler.encodeMessage(data)
+    message_asc = message_handler.bin2asc(message)
     if output_file:
         with open(output_file, 'wb') as fd:
             fd.write(message)
     else:
-        print(message_handler.bin2asc(message))
+        print(message_asc)
     if send:
+        import configparser
+        from balloon_operator import credentials
         config = configparser.ConfigParser()
         config.read(send)
         if 'password' in config['rockblock'] and config['rockblock']['password']:
@@ -629,7 +771,7 @@ def encodeMessage(position=None, time=None, userfunc=None, output_file=None, sen
             password = credentials.getPassword('rockblock', config['rockblock']['user'])
         status, error_message = message_handler.sendMessage(
                 config['device']['imei'], message,
-                config['rockblock']['user'], password)
+                config['rockblock']['user'], password, data_asc=message_asc)
         if status:
             print('Message sent.')
         else:
@@ -646,18 +788,18 @@ if __name__ == "__main__":
     parser.add_argument('-d', '--decode', required=False, default=None, help='Translate binary message given as hex string')
     parser.add_argument('-e', '--encode', required=False, action='store_true', default=False, help='Encode binary message')
     parser.add_argument('-p', '--position', required=False, default=None, help='Position lon,lat,alt')
-    parser.add_argument('-t', '--time', required=False, nargs='?', default=None, const=datetime.datetime.utcnow(), help='UTC time in ISO format YYYY-mm-dd HH:MM:SS, or now if no argument given')
+    parser.add_argument('-t', '--time', required=False, nargs='?', default=None, const=lambda: datetime.datetime.now(datetime.timezone.utc), help='UTC time in ISO format YYYY-mm-dd HH:MM:SS, or now if no argument given')
     parser.add_argument('-u', '--userfunc', required=False, default=None, help='User function (comma-separated list of functions to trigger)')
     parser.add_argument('-s', '--send', required=False, default=None, help='Send message to device as specified in configuration file')
     args = parser.parse_args()
     if args.encode:
         if args.position is not None:
-            position = np.array(args.position.split(',')).astype(float)
+            position = tuple(float(x) for x in args.position.split(','))
         else:
             position = None
         if args.time is not None:
-            if isinstance(args.time, datetime.datetime):
-                time = args.time
+            if callable(args.time): # no argument given, take current time
+                time = args.time()
             else:
                 time = datetime.datetime.fromisoformat(args.time)
         else:
@@ -27,7 +27,7 @@ from PySide6.QtUiTools import QUiLoader
 from gui_mainwidget import Ui_MainWidget
 from gui_operatorwidget import Ui_OperatorWidget
 import gui_icons
-from balloon_operator import filling, parachute, trajectory_predictor, download_model_data, message, message_sbd, utils, comm
+from balloon_operator import filling, parachute, message, message_sbd, utils, comm
 import configparser
 import datetime
 import argparse
@@ -128,16 +128,21 @@ class MainWidget(QWidget):
         self.ui.edit_webpage_file.setText(os.path.join(output_dir, 'trajectory.html'))
         self.ui.edit_map_file.setText(os.path.join(output_dir, 'trajectory.png'))
         self.ui.edit_tsv_file.setText(os.path.join(output_dir, 'trajectory.tsv'))
-        self.balloon_parameter_list = np.zeros((3,0), dtype=[('weight', 'f8'), ('burst_diameter', 'f8'), ('drag_coefficient', 'f8')])
+        self.balloon_parameter_list = {'weight': np.zeros(0), 'burst_diameter': np.zeros(0), 'drag_coefficient': np.zeros(0)}
+        self.balloon_parameter_index = {}
         self.balloon_parameter_file = None
-        self.parachute_parameter_list = np.zeros((3,0), dtype=[('name', 'U25'), ('diameter', 'f8'), ('drag_coefficient', 'f8')])
+        self.parachute_parameter_list = {'name': np.zeros(0, dtype='U25'), 'diameter': np.zeros(0), 'drag_coefficient': np.zeros(0)}
+        self.parachute_parameter_index = {}
         self.parachute_parameter_file = None
         self.balloon_performance = {}
+        self.balloon_parameter_timer = QTimer(self)
+        self.balloon_parameter_timer.setSingleShot(True)
+        self.balloon_parameter_timer.setInterval(50) # coalesce rapid changes, e.g. while spinning a value
+        self.balloon_parameter_timer.timeout.connect(self.updateBalloonPerformance)
         self.timestep = 10
         self.model_path = tempfile.gettempdir()
         self.setBalloonPicture(self.ui.check_descent_balloon.isChecked())
-        for model_name in trajectory_predictor.readModelData.keys():
-            self.ui.combo_model.addItem(model_name)
+        QTimer.singleShot(0, self.loadModelNames) # defer import of the trajectory predictor until the GUI is up
 
         self.ui.button_load_payload.clicked.connect(self.onLoadPayload)
         self.ui.button_save_payload.clicked.connect(self.onSavePayload)
@@ -164,12 +169,22 @@ class MainWidget(QWidget):
         self.threadpool = QThreadPool()
         logging.info('Multithreading with maximum {} threads'.format(self.threadpool.maxThreadCount()))
 
+    @Slot()
+    def loadModelNames(self):
+        """
+        Load the names of the supported models into the combo box.
+        """
+        from balloon_operator import trajectory_predictor
+        for model_name in trajectory_predictor.readModelData.keys():
+            self.ui.combo_model.addItem(model_name)
+
     def loadBalloonParameters(self, filename):
         """
         Load balloon parameter data into the combo boxes.
         """
         self.balloon_parameter_file = filename
         self.balloon_parameter_list = filling.readBalloonParameterList(filename)
+        self.balloon_parameter_index = filling.parameterIndex(self.balloon_parameter_list, key='weight')
         self.ui.combo_asc_balloon.clear()
         self.ui.combo_desc_balloon.clear()
         for ind in range(len(self.balloon_parameter_list['weight'])):
@@ -183,6 +198,7 @@ class MainWidget(QWidget):
         """
         self.parachute_parameter_file = filename
         self.parachute_parameter_list = parachute.readParachuteParameterList(filename)
+        self.parachute_parameter_index = filling.parameterIndex(self.parachute_parameter_list, key='name')
         self.ui.combo_parachute.clear()
         for ind in range(len(self.parachute_parameter_list['name'])):
             self.ui.combo_parachute.addItem(self.parachute_parameter_list['name'][ind])
@@ -269,43 +285,48 @@ class MainWidget(QWidget):
         """
         Compute balloon performance and update display.
         """
-        payload_weight = self.ui.spin_payload_weight.value()
-        fill_gas = self.ui.combo_fill_gas.currentData()
-        ascent_balloon_parameters = filling.lookupParameters(self.balloon_parameter_list, self.ui.combo_asc_balloon.currentData())
-        ascent_velocity = self.ui.spin_asc_velocity.value()
-        if self.ui.check_descent_balloon.isChecked():
-            descent_balloon_parameters = filling.lookupParameters(self.balloon_parameter_list, self.ui.combo_desc_balloon.currentData())
-            descent_velocity = self.ui.spin_desc_velocity.value()
-            ascent_launch_radius, descent_launch_radius, ascent_neutral_lift, descent_neutral_lift, \
-            ascent_burst_height, descent_burst_height = filling.twoBalloonFilling(
-                ascent_balloon_parameters, descent_balloon_parameters, payload_weight, 
-                ascent_velocity, descent_velocity, fill_gas=fill_gas)
-            descent_fill_volume = 4./3.*np.pi*descent_launch_radius**3
-            self.ui.label_desc_fill_volume_value.setText('{:.3f} m3'.format(descent_fill_volume))
-            self.ui.label_desc_lift_value.setText('{:.3f} kg'.format(descent_neutral_lift))
-            self.ui.label_desc_burst_height_value.setText('{:.0f} m'.format(descent_burst_height))
-        else:
-            ascent_launch_radius, ascent_neutral_lift, ascent_burst_height = filling.balloonFilling(
-                    ascent_balloon_parameters, payload_weight, ascent_velocity, fill_gas=fill_gas)
-            descent_balloon_parameters = None
-            descent_velocity = None
-            descent_launch_radius = None
-            descent_burst_height = None
-            self.ui.label_desc_fill_volume_value.setText('--')
-            self.ui.label_desc_lift_value.setText('--')
-            self.ui.label_desc_burst_height_value.setText('--')
-        ascent_fill_volume = 4./3.*np.pi*ascent_launch_radius**3
-        self.ui.label_asc_fill_volume_value.setText('{:.3f} m3'.format(ascent_fill_volume))
-        self.ui.label_asc_lift_value.setText('{:.3f} kg'.format(ascent_neutral_lift))
-        self.ui.label_asc_burst_height_value.setText('{:.0f} m'.format(ascent_burst_height))
-        self.balloon_performance = {
-                'payload_weight': payload_weight,
-                'ascent_velocity': ascent_velocity,
-                'ascent_launch_radius': ascent_launch_radius,
-                'ascent_burst_height': ascent_burst_height,
-                'descent_velocity': descent_velocity,
-                'descent_launch_radius': descent_launch_radius,
-                'descent_burst_height': descent_burst_height}
+        self.setUpdatesEnabled(False)
+        try:
+            payload_weight = self.ui.spin_payload_weight.value()
+            fill_gas = self.ui.combo_fill_gas.currentData()
+            ascent_balloon_parameters = self.balloon_parameter_index.get(self.ui.combo_asc_balloon.currentData())
+            ascent_velocity = self.ui.spin_asc_velocity.value()
+            if self.ui.check_descent_balloon.isChecked():
+                descent_balloon_parameters = self.balloon_parameter_index.get(self.ui.combo_desc_balloon.currentData())
+                descent_velocity = self.ui.spin_desc_velocity.value()
+                ascent_launch_radius, descent_launch_radius, ascent_neutral_lift, descent_neutral_lift, \
+                ascent_burst_height, descent_burst_height = filling.twoBalloonFilling(
+                    ascent_balloon_parameters, descent_balloon_parameters, payload_weight, 
+                    ascent_velocity, descent_velocity, fill_gas=fill_gas)
+                descent_fill_volume = 4./3.*np.pi*descent_launch_radius**3
+                self.ui.label_desc_fill_volume_value.setText('{:.3f} m3'.format(descent_fill_volume))
+                self.ui.label_desc_lift_value.setText('{:.3f} kg'.format(descent_neutral_lift))
+                self.ui.label_desc_burst_height_value.setText('{:.0f} m'.format(descent_burst_height))
+            else:
+                ascent_launch_radius, ascent_neutral_lift, ascent_burst_height = filling.balloonFilling(
+                        ascent_balloon_parameters, payload_weight, ascent_velocity, fill_gas=fill_gas)
+                descent_balloon_parameters = None
+                descent_velocity = None
+                descent_launch_radius = None
+                descent_burst_height = None
+                self.ui.label_desc_fill_volume_value.setText('--')
+                self.ui.label_desc_lift_value.setText('--')
+                self.ui.label_desc_burst_height_value.setText('--')
+            ascent_fill_volume = 4./3.*np.pi*ascent_launch_radius**3
+            self.ui.label_asc_fill_volume_value.setText('{:.3f} m3'.format(ascent_fill_volume))
+            self.ui.label_asc_lift_value.setText('{:.3f} kg'.format(ascent_neutral_lift))
+            self.ui.label_asc_burst_height_value.setText('{:.0f} m'.format(ascent_burst_height))
+            self.balloon_performance = {
+                    'payload_weight': payload_weight,
+                    'ascent_velocity': ascent_velocity,
+                    'ascent_launch_radius': ascent_launch_radius,
+                    'ascent_burst_height': ascent_burst_height,
+                    'descent_velocity': descent_velocity,
+                    'descent_launch_radius': descent_launch_radius,
+                    'descent_burst_height': descent_burst_height}
+        finally:
+            self.setUpdatesEnabled(True)
+            self.update()
 
     def setWarningText(self):
         ascent_burst_height = self.balloon_performance['ascent_burst_height']
@@ -381,8 +402,11 @@ class MainWidget(QWidget):
         """
         Get parameters for flight.
         """
+        if self.balloon_parameter_timer.isActive(): # apply pending balloon parameter changes
+            self.balloon_parameter_timer.stop()
+            self.updateBalloonPerformance()
         parameters = {
-                'parachute_parameters': parachute.lookupParachuteParameters(self.parachute_parameter_list, self.ui.combo_parachute.currentText()),
+                'parachute_parameters': self.parachute_parameter_index.get(self.ui.combo_parachute.currentText()),
                 'payload_area': self.ui.spin_payload_area.value(),
                 'launch_lon': self.ui.spin_launch_longitude.value(),
                 'launch_lat': self.ui.spin_launch_latitude.value(),
@@ -410,6 +434,7 @@ class MainWidget(QWidget):
         Compute a trajectory forecast.
         Function is typically executed in a separate thread.
         """
+        from balloon_operator import trajectory_predictor, download_model_data
         # Download and read in model data.
         model_filenames = download_model_data.getModelData(
                 parameters['model'],
@@ -482,6 +507,7 @@ class MainWidget(QWidget):
         Compute an hourly forecast.
         Function is typically executed in a separate thread.
         """
+        from balloon_operator import trajectory_predictor
         hourly_track, _, _ = trajectory_predictor.hourlyForecast(
             parameters['launch_datetime'], parameters['launch_lon'],
             parameters['launch_lat'], parameters['launch_alt'],
@@ -539,6 +565,15 @@ class MainWidget(QWidget):
     def onChangeBalloonParameter(self, value):
         """
         Callback when a balloon parameter is changed.
+        The update is deferred by a short single-shot timer such that a burst
+        of changes only triggers one computation.
+        """
+        self.balloon_parameter_timer.start()
+
+    @Slot()
+    def updateBalloonPerformance(self):
+        """
+        Callback when the deferred balloon parameter update is due.
         """
         self.computeBalloonPerformance()
         self.setWarningText()
@@ -665,6 +700,9 @@ class MainWidget(QWidget):
         """
         Callback when the button to do live operation is clicked.
         """
+        if self.balloon_parameter_timer.isActive(): # apply pending balloon parameter changes
+            self.balloon_parameter_timer.stop()
+            self.updateBalloonPerformance()
         if not self.balloon_performance:
             QMessageBox.critical(self, self.tr('Live operation'), self.tr('Flight data not set. Please make the respective settings first.'))
             return
@@ -907,6 +945,7 @@ class OperatorWidget(QWidget):
         """
         Downloads model data for live forecast.
         """
+        from balloon_operator import trajectory_predictor, download_model_data
         self.ui.label_status.setText(self.tr('Downloading model data.'))
         if self.flight_parameters['launch_datetime'] is None:
             self.flight_parameters['launch_datetime'] = datetime.datetime.utcnow()
@@ -973,6 +1012,7 @@ class OperatorWidget(QWidget):
         """
         Query new messages from server.
         """
+        from balloon_operator import trajectory_predictor
         from_address = self.ui.combo_receive_imei.currentData() + '@rockblock.rock7.com'
         print("Querying messages from {} ...".format(from_address)) # DEBUG
         messages = self.message_handler.getDecodedMessages(from_address=from_address)
@@ -1009,6 +1049,7 @@ class OperatorWidget(QWidget):
         Performs a live forecast.
         This function is usually started in a separate worker thread.
         """
+        from balloon_operator import trajectory_predictor
         print('Starting forecast from message: {}'.format(msg)) # DEBUG
         self.ui.label_status.setText(self.tr('Computing trajectory forecast.'))
         if self.model_data is None:
@@ -21,6 +21,8 @@ You should have received a copy of the GNU General Public License along with
 Balloon Operator. If not, see <https://www.gnu.org/licenses/>.
 """
 
+import math
+import functools
 import numpy as np
 from balloon_operator import filling
 
@@ -32,22 +34,22 @@ def readParachuteParameterList(filename):
 
     @param filename CSV file name of the data
 
-    @return named array with parachute parameters, names are 'name', 'diameter', 'drag_coefficient'
+    @return dictionary of column arrays with parachute parameters, keys are 'name', 'diameter', 'drag_coefficient'
     """
-    return np.genfromtxt(
+    return filling.parameterColumns(np.genfromtxt(
             filename, delimiter='\t', skip_header=1,
             names=['name', 'diameter', 'drag_coefficient'],
-            dtype=['U25', 'f8', 'f8'])
+            dtype=['U25', 'f8', 'f8']))
 
 
 def lookupParachuteParameters(parameter_list, name):
     """
     Look up parachute parameters for a given name.
 
-    @param parameter_list parameter table as named array, e.g. as read with readParachuteParameterList
+    @param parameter_list parameter table as dictionary of column arrays, e.g. as read with readParachuteParameterList
     @param name name to look up the data
 
-    @return selected column of the named array, or None if the given weight is not in the list.
+    @return dictionary with the parameters of the selected row, or None if the given name is not in the list.
     """
     return filling.lookupParameters(parameter_list, name, key='name')
 
@@ -58,6 +60,7 @@ def parachuteDescent(alt_start, timestep, payload_weight, parachute_parameters,
 
     This is a port of the descent function in Jens Söder's BalloonTrajectory
     MATLAB program.
+    Results are cached, the returned arrays are therefore read-only.
 
     @param alt_start start altitude in m
     @param timestep time step of the output arrays in seconds
@@ -70,10 +73,26 @@ def parachuteDescent(alt_start, timestep, payload_weight, parachute_parameters,
     @return altitude array of altitudes in m
     @return velocity array of velocities in m/s
     """
+    # Convert to Python floats, scalar arithmetic on NumPy scalars is much slower.
+    return descentCurve(
+            float(alt_start), float(timestep), float(payload_weight),
+            float(parachute_parameters['drag_coefficient']),
+            float(parachute_parameters['diameter']),
+            float(payload_area), float(payload_drag_coefficient),
+            float(initial_velocity))
+
+
+@functools.lru_cache(maxsize=64)
+def descentCurve(alt_start, timestep, payload_weight, parachute_drag_coefficient, parachute_diameter, payload_area, payload_drag_coefficient, initial_velocity):
+    """
+    Compute descent on parachute for given scalar parameters.
+    This is the cached implementation of parachuteDescent, see there for
+    the description of the parameters and return values.
+    """
 
     # Initialise variables.
     t = 0
-    z = alt_start;
+    z = alt_start
     s = initial_velocity
 
     delt=.2
@@ -93,11 +112,20 @@ def parachuteDescent(alt_start, timestep, payload_weight, parachute_parameters,
     # Use Runge-Kutta-Algorithm to solve DEq.
     H = T*Rs/g
 
-    cdpara = parachute_parameters['drag_coefficient']
-    paraarea = np.pi*parachute_parameters['diameter']**2/4.
+    cdpara = parachute_drag_coefficient
+    paraarea = math.pi*parachute_diameter*parachute_diameter/4.
     cdbox = payload_drag_coefficient
     boxarea = payload_area
     m = payload_weight
+    # Hoist loop invariants: the drag term is drag_factor*exp(-z/H)*v^2.
+    drag_factor = 1/(2*m)*rhoa*(cdpara*paraarea+cdbox*boxarea)
+    inv_H = 1./H
+    half_delt = delt/2
+    # Relative deviation from terminal velocity within which the payload follows
+    # it. The steps are as fast with 5 % as with 1 %, but the velocity jump when
+    # entering the band and hence the altitude error is about halved with 1 %.
+    terminal_velocity_tolerance = 0.01
+    lag_factor = inv_H/(4*g)
     max_iter = 10000000
     time = np.zeros(max_iter)
     altitude = np.zeros(max_iter)
@@ -106,20 +134,42 @@ def parachuteDescent(alt_start, timestep, payload_weight, parachute_parameters,
         if z < 0:
             break # Interrupt integration when reaching groundlevel.
 
-        k1z = s
-        k1s = -g+1/(2*m)*rhoa*np.exp(-z/H)*(cdpara*paraarea+cdbox*boxarea)*s**2
-
-        k2z = s+delt/2*k1s
-        k2s = -g+1/(2*m)*rhoa*np.exp(-(z+delt/2*k1z)/H)*(cdpara*paraarea+cdbox*boxarea)*(s+delt/2*k1s)**2
-
-        k3z = s+delt/2*k2s
-        k3s = -g+1/(2*m)*rhoa*np.exp(-(z+delt/2*k2z)/H)*(cdpara*paraarea+cdbox*boxarea)*(s+delt/2*k2s)**2
-
-        k4z = s+delt*k3s;
-        k4s = -g+1/(2*m)*rhoa*np.exp(-(z+delt*k3z)/H)*(cdpara*paraarea+cdbox*boxarea)*(s+delt*k3s)**2
-
-        zn = z+delt/6*(k1z+2*k2z+2*k3z+k4z)
-        sn = s+delt/6*(k1s+2*k2s+2*k3s+k4s)
+        density_factor = drag_factor*math.exp(-z*inv_H)
+
+        # Close to terminal velocity the drag balances gravity, and the
+        # payload follows the slowly varying terminal velocity. Since the terminal
+        # velocity decreases during descent, the velocity lags behind it by the
+        # relative amount v_t^2/(4 g H). This first-order lag only holds if it
+        # is small, i.e. for a sufficiently large drag, so the shortcut is
+        # restricted to lags below the tolerance.
+        if density_factor > 0:
+            terminal_velocity = math.sqrt(g/density_factor)
+            is_terminal = lag_factor*terminal_velocity*terminal_velocity < terminal_velocity_tolerance \
+                    and abs(s+terminal_velocity) < terminal_velocity_tolerance*terminal_velocity
+        else: # no drag
+            is_terminal = False
+        if is_terminal:
+            zn = z+delt*s
+            terminal_velocity = math.sqrt(g/(drag_factor*math.exp(-zn*inv_H)))
+            sn = -terminal_velocity*(1.+lag_factor*terminal_velocity*terminal_velocity)
+        else:
+            # The stages only displace z by a few metres, much less than the
+            # scale height H, so the density factor of stages 2-4 is obtained
+            # from a first-order expansion of exp(-z/H) around z.
+            k1z = s
+            k1s = -g+density_factor*s*s
+
+            k2z = s+half_delt*k1s
+            k2s = -g+density_factor*(1.-half_delt*k1z*inv_H)*k2z*k2z
+
+            k3z = s+half_delt*k2s
+            k3s = -g+density_factor*(1.-half_delt*k2z*inv_H)*k3z*k3z
+
+            k4z = s+delt*k3s
+            k4s = -g+density_factor*(1.-delt*k3z*inv_H)*k4z*k4z
+
+            zn = z+delt/6*(k1z+2*k2z+2*k3z+k4z)
+            sn = s+delt/6*(k1s+2*k2s+2*k3s+k4s)
 
         time[i] = t
         altitude[i] = z
@@ -135,22 +185,24 @@ def parachuteDescent(alt_start, timestep, payload_weight, parachute_parameters,
     altitude = altitude[:i]
     velocity = velocity[:i]
 
-    # Downsample data array.
+    # Downsample data array, keeping the last point.
     if len(time) == 0:
-        return time, altitude, velocity
-    time_end = time[-1]
-    altitude_end = altitude[-1]
-    velocity_end = velocity[-1]
+        return np.zeros(0), np.zeros(0), np.zeros(0)
     downsampling_factor = int(np.round(timestep/delt))
-    time = time[::downsampling_factor]
-    altitude = altitude[::downsampling_factor]
-    velocity = velocity[::downsampling_factor]
-    if time[-1] != time_end: # If last point(s) are removed by downsampling.
-        time = np.append(time, time_end)
-        altitude = np.append(altitude, altitude_end)
-        velocity = np.append(velocity, velocity_end)
-
-    return time, altitude, velocity
+    n_sampled = (len(time) + downsampling_factor - 1) // downsampling_factor
+    if (len(time) - 1) % downsampling_factor == 0:
+        n_out = n_sampled
+    else: # If last point(s) are removed by downsampling.
+        n_out = n_sampled + 1
+    # Store time, altitude and velocity as rows of one buffer, so that each is contiguous.
+    descent = np.empty((3, n_out))
+    descent[0, :n_sampled] = time[::downsampling_factor]
+    descent[1, :n_sampled] = altitude[::downsampling_factor]
+    descent[2, :n_sampled] = velocity[::downsampling_factor]
+    descent[:, -1] = (time[-1], altitude[-1], velocity[-1])
+    descent.flags.writeable = False # results are shared through the cache
+
+    return descent[0], descent[1], descent[2]
 
 
 if __name__ == '__main__':
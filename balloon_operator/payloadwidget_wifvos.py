@@ -19,10 +19,59 @@ You should have received a copy of the GNU General Public License along with
 Balloon Operator. If not, see <https://www.gnu.org/licenses/>.
 """
 
+import functools
 from PySide6.QtWidgets import QWidget, QLabel
-import numpy as np
+from PySide6.QtCore import QEvent
+
+# Translation of binary digits into valve glyphs followed by a separator.
+valve_glyphs = str.maketrans({'0': '- ', '1': 'o '})
+
+def valveText(state, n_valves=12):
+    """
+    Create display text of a valve manifold, 'o' for open and '-' for closed
+    valves.
+
+    @param state valve states as integer, valve 1 in bit 0
+    @param n_valves number of valves (default: 12)
+
+    @return valve text, e.g. 'o o - - - - - - - - - -'
+    """
+    bits = format(state & ((1 << n_valves) - 1), '0{}b'.format(n_valves))
+    return bits[::-1].translate(valve_glyphs)[:-1] # valve 1 first, without trailing separator
+
+
+# Display text of a valve manifold for each of the 4096 states of its 12 valves.
+# The table is composed of the texts of the lower and upper 6 valves.
+valve_half_text_table = tuple(valveText(state, n_valves=6) for state in range(64))
+valve_text_table = tuple(
+        valve_half_text_table[state & 0x3f] + ' ' + valve_half_text_table[state >> 6]
+        for state in range(4096))
+
+@functools.lru_cache(maxsize=1)
+def valveTextArray():
+    """
+    Get the valve text table as read-only NumPy array, created on first use.
+    """
+    import numpy as np
+    table = np.array(valve_text_table)
+    table.setflags(write=False)
+    return table
+
+# Cutter 1, cutter 2, heating, pump and event status for each of the 32 values of the USERVAL1 status bits.
+status_table = tuple(
+        ((value & 1) == 1, (value & 2) == 2, (value & 4) == 4, (value & 8) == 8, (value & 16) == 16)
+        for value in range(32))
 
 class PayloadWidgetWifvos(QWidget):
+    """
+    Widget showing the data of the WIFVOS payload.
+    """
+    # Numeric fields shown in the widget: label attribute, message field and unit.
+    NUMERIC_FIELDS = (
+            ('label_press', 'USERVAL3', 'Pa'),
+            ('label_flowrate', 'USERVAL4', 'sccm'),
+            ('label_heating_temperature', 'USERVAL2', '°C'))
+
     def __init__(self, widget=None):
         """
         Constructor
@@ -31,35 +80,64 @@ class PayloadWidgetWifvos(QWidget):
         """
         super(PayloadWidgetWifvos, self).__init__()
         self.widget = widget
+        self.translateTexts()
+        if widget is not None: # look up the labels once, not on every message
+            self.label_press = widget.findChild(QLabel, 'label_manifold_pressure_value')
+            self.label_flowrate = widget.findChild(QLabel, 'label_flowrate_value')
+            self.label_inlet = widget.findChild(QLabel, 'label_inlet_status')
+            self.label_outlet = widget.findChild(QLabel, 'label_outlet_status')
+            self.label_pump = widget.findChild(QLabel, 'label_pump_status')
+            self.label_heating_temperature = widget.findChild(QLabel, 'label_heating_temperature_value')
+            self.label_event = widget.findChild(QLabel, 'label_event_value')
 
     @staticmethod
     def parseUserval1(userval1):
         """
         Parse cutter, heating, pump and event status from USERVAL1 field.
         """
-        cutter1_status = (userval1 & 1) == 1
-        cutter2_status = (userval1 & 2) == 2
-        heating_status = (userval1 & 4) == 4
-        pump_status = (userval1 & 8) == 8
-        event_status = (userval1 & 16) == 16
-        return cutter1_status, cutter2_status, heating_status, pump_status, event_status
+        return status_table[userval1 & 0x1f]
 
     @staticmethod
     def parseUserval5(userval5):
         """
         Parse valve status from USERVAL5 field.
         """
-        valve_states = [np.uint16(userval5 & 0xffff), np.uint16(userval5 >> 16)]
-        valve_text = ['', '']
-        for manifold in range(2):
-            for valve in range(12):
-                if len(valve_text[manifold]) > 0:
-                    valve_text[manifold] += ' '
-                valve_text[manifold] += 'o' if valve_states[manifold] & (1 << valve) else '-'
-        return valve_text
+        return (valve_text_table[userval5 & 0xfff], valve_text_table[(userval5 >> 16) & 0xfff])
+
+    @staticmethod
+    def parseUserval5Batch(userval5):
+        """
+        Parse valve status from many USERVAL5 fields at once, e.g. when
+        replaying logged messages.
+
+        @param userval5 array of USERVAL5 values
+
+        @return array of shape (n, 2) with valve texts of inlet and outlet manifold
+        """
+        import numpy as np
+        table = valveTextArray()
+        userval5 = np.asarray(userval5, dtype=np.uint32)
+        return np.stack((table[userval5 & 0xfff], table[(userval5 >> 16) & 0xfff]), axis=-1)
+
+    def translateTexts(self):
+        """
+        Translate the status texts once instead of on every message.
+        """
+        self.text_on = self.tr('on')
+        self.text_off = self.tr('off')
+        self.text_yes = self.tr('yes')
+        self.text_no = self.tr('no')
+
+    def changeEvent(self, event):
+        """
+        Re-translate the status texts when the language changes.
+        """
+        if event.type() == QEvent.LanguageChange:
+            self.translateTexts()
+        super(PayloadWidgetWifvos, self).changeEvent(event)
 
     def statusText(self, status):
-        return self.tr('on') if status else self.tr('off')
+        return self.text_on if status else self.text_off
 
     def setPayloadData(self, data):
         """
@@ -67,35 +145,31 @@ class PayloadWidgetWifvos(QWidget):
     
         @param data message data
         """
-        widget_press =  self.widget.findChild(QLabel, 'label_manifold_pressure_value')
-        widget_press.setText(
-                '{} Pa'.format(data['USERVAL3']) if 'USERVAL3' in data
-                else '?? Pa')
-        widget_flowrate =  self.widget.findChild(QLabel, 'label_flowrate_value')
-        widget_flowrate.setText(
-                '{} sccm'.format(data['USERVAL4']) if 'USERVAL4' in data
-                else '?? sccm')
-        widget_inlet = self.widget.findChild(QLabel, 'label_inlet_status')
-        widget_outlet = self.widget.findChild(QLabel, 'label_outlet_status')
-        widget_pump = self.widget.findChild(QLabel, 'label_pump_status')
-        widget_heating_temperature = self.widget.findChild(QLabel, 'label_heating_temperature_value')
-        widget_event = self.widget.findChild(QLabel, 'label_event_value')
-        if 'USERVAL5' in data:
-            valve_text = self.parseUserval5(data['USERVAL5'])
+        for label, key, unit in self.NUMERIC_FIELDS:
+            value = data.get(key)
+            getattr(self, label).setText(
+                    f'{value} {unit}' if value is not None
+                    else f'?? {unit}')
+        userval5 = data.get('USERVAL5')
+        if userval5 is not None:
+            valve_text = self.parseUserval5(userval5)
         else:
-            valve_text = ['??', '??']
-        widget_inlet.setText(valve_text[0])
-        widget_outlet.setText(valve_text[1])
-        if 'USERVAL1' in data:
-            cutter1_status, cutter2_status, heating_status, pump_status, event_status = self.parseUserval1(data['USERVAL1'])
-            widget_pump.setText(self.statusText(pump_status))
-            widget_event.setText(self.tr('yes') if event_status else self.tr('no'))
+            valve_text = ('??', '??')
+        self.label_inlet.setText(valve_text[0])
+        self.label_outlet.setText(valve_text[1])
+        userval1 = data.get('USERVAL1')
+        if userval1 is not None:
+            cutter1_status, cutter2_status, heating_status, pump_status, event_status = self.parseUserval1(userval1)
+            self.label_pump.setText(self.statusText(pump_status))
+            self.label_event.setText(self.text_yes if event_status else self.text_no)
         else:
-            widget_pump.setText('??')
-            widget_event.setText('??')
-        widget_heating_temperature.setText(
-                '{} °C'.format(data['USERVAL2']) if 'USERVAL2' in data
-                else '?? °C')
+            self.label_pump.setText('??')
+            self.label_event.setText('??')
+
+# Parsers as module-level functions for use without a widget.
+parseUserval1 = PayloadWidgetWifvos.parseUserval1
+parseUserval5 = PayloadWidgetWifvos.parseUserval5
+parseUserval5Batch = PayloadWidgetWifvos.parseUserval5Batch
 
 if __name__ == '__main__':
     """
@@ -115,13 +189,13 @@ if __name__ == '__main__':
         data = message_handler.decodeMessage(message_sbd.MessageSbd.asc2bin(args.message))
         print(data)
         if 'USERVAL1' in data:
-            cutter1_status, cutter2_status, heating_status, pump_status, event_status = PayloadWidgetWifvos.parseUserval1(data['USERVAL1'])
+            cutter1_status, cutter2_status, heating_status, pump_status, event_status = parseUserval1(data['USERVAL1'])
             print('Cutters: {}, {}'.format(operator_instance.cutterStateText(cutter1_status), operator_instance.cutterStateText(cutter2_status)))
             print('Heating: {}'.format(operator_instance.heatingStateText(heating_status)))
             print('Pump: {}'.format(wifvos_instance.statusText(pump_status)))
             print('Is {} event message.'.format('an' if event_status else 'no'))
         if 'USERVAL5' in data:
-            valve_text = PayloadWidgetWifvos.parseUserval5(data['USERVAL5'])
+            valve_text = parseUserval5(data['USERVAL5'])
             print('Inlet:  {}'.format(valve_text[0]))
             print('Outlet: {}'.format(valve_text[1]))
         if 'USERVAL2' in data:
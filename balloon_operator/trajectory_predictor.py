@@ -20,11 +20,10 @@ Balloon Operator. If not, see <https://www.gnu.org/licenses/>.
 """
 
 import numpy as np
-from scipy.interpolate import RegularGridInterpolator
-from scipy.optimize import curve_fit
 import pygrib
 import datetime
 import time
+import functools
 import gpxpy
 import gpxpy.gpx
 import srtm
@@ -37,23 +36,31 @@ import logging
 import tempfile
 from copy import deepcopy
 import traceback
-from balloon_operator import filling, parachute, download_model_data, constants, message, message_sbd, message_file, comm, utils
+from balloon_operator import filling, parachute, download_model_data, constants, message, message_sbd, message_file, comm, utils, interpolation
 
 
-def m2deg(lon, lat, u, v):
+def m2deg(lon, lat, u, v, inplace=False):
     """
     Convert winds u, v from m/s to deg/s.
 
     @param lon longitude grid
     @param lat latitude grid
-    @param u u winds in m/s
-    @param v v winds in m/s
+    @param u u winds in m/s, with dimensions (..., lat, lon)
+    @param v v winds in m/s, with dimensions (..., lat, lon)
+    @param inplace whether to convert u and v in place instead of allocating
+        new arrays (default: False)
 
     @return u_deg u winds in deg/s
     @return v_deg v winds in deg/s
     """
-    u_deg = u*360./np.tile(2.*np.pi*constants.r_earth*np.cos(np.radians(lat)), (len(lon),1))
-    v_deg = v*360./(2.*np.pi*constants.r_earth)
+    deg_per_m = 360./(2.*np.pi*constants.r_earth)
+    u_factor = (deg_per_m/np.cos(np.radians(lat)))[:,np.newaxis].astype(u.dtype) # broadcast along the longitude dimension, keep precision of u
+    if inplace:
+        u *= u_factor
+        v *= deg_per_m
+        return u, v
+    u_deg = u * u_factor
+    v_deg = v * deg_per_m
     return u_deg, v_deg
 
 
@@ -66,55 +73,49 @@ def readGfsDataFile(filename):
     @return model_data a dictionary with the model data with the following keys:
         'datetime', 'press', 'lon', 'lat', 'surface_pressure', 'surface_altitude',
         'altitude', 'u_wind_deg', 'v_wind_deg'
+        Gridded variables have the dimensions (lev, lat, lon).
     """
+    # Read all messages in one pass, collecting the level fields of each variable.
     grbidx = pygrib.open(filename)
-    # Get levels in GRIB file. Assume all variables have same order of levels.
-    levels = []
+    # Identify variables by short name, the long names differ between ecCodes versions.
+    level_vars = {'u': 'u', 'v': 'v', 'gh': 'altitude'}
+    levels = {'u': [], 'v': [], 'altitude': []}
+    fields = {'u': [], 'v': [], 'altitude': []}
     lat = None
     lon = None
-    for grb in grbidx:
-        if grb.name == 'U component of wind':
-            levels.append(grb.level)
-            lat, lon = grb.latlons()
-            lat = lat[:,0]
-            lon = lon[0,:]
-            dt = grb.validDate
-    if lat is None or lon is None:
-        logging.error('Error: No valid U entries in grib file {}!'.format(filename))
-        return None
-    # Read in data.
-    u_wind = np.zeros((len(levels), len(lon), len(lat)))
-    v_wind = np.zeros((len(levels), len(lon), len(lat)))
-    altitude = np.zeros((len(levels), len(lon), len(lat)))
     surface_pressure = None
     surface_altitude = None
-    grbidx.seek(0)
-    ind_level_u = 0
-    ind_level_v = 0
-    ind_level_alt = 0
     for grb in grbidx:
-        if grb.name == 'U component of wind':
-            assert(grb.level == levels[ind_level_u])
-            u_wind[ind_level_u, :, :] = grb.values.transpose()
-            ind_level_u += 1
-        elif grb.name == 'V component of wind':
-            assert(grb.level == levels[ind_level_v])
-            v_wind[ind_level_v, :, :] = grb.values.transpose()
-            ind_level_v += 1
-        elif grb.name == 'Geopotential Height':
-            assert(grb.level == levels[ind_level_alt])
-            altitude[ind_level_alt, :, :] = grb.values.transpose()
-            ind_level_alt += 1
-        elif grb.name == 'Surface pressure':
-            surface_pressure = grb.values.transpose()
-        elif grb.name == 'Orography':
-            surface_altitude = grb.values.transpose()
+        if grb.shortName in level_vars:
+            var = level_vars[grb.shortName]
+            levels[var].append(grb.level)
+            fields[var].append(grb.values)
+            if lat is None and var == 'u':
+                lat, lon = grb.latlons()
+                lat = lat[:,0]
+                lon = lon[0,:]
+                dt = grb.validDate
+        elif grb.shortName == 'sp':
+            surface_pressure = grb.values
+        elif grb.shortName == 'orog':
+            surface_altitude = grb.values
         else:
-            logging.warning('Unused variable: {}'.format(grb.name))
+            logging.debug('Unused variable: {}'.format(grb.name))
     grbidx.close()
+    if lat is None or lon is None:
+        logging.error('Error: No valid U entries in grib file {}!'.format(filename))
+        return None
+    # Assume all variables have same order of levels.
+    assert(levels['v'] == levels['u'] and levels['altitude'] == levels['u'])
+    levels = levels['u']
+    # Arrays are in the native (lat, lon) order of the GRIB fields, and in
+    # single precision like the GRIB data, which halves the memory footprint.
+    u_wind = np.array(fields['u'], dtype=np.float32)
+    v_wind = np.array(fields['v'], dtype=np.float32)
+    altitude = np.array(fields['altitude'], dtype=np.float32)
+    del fields
     # Convert winds from m/s to deg/s
-    for ind_level in range(len(levels)):
-        u_wind[ind_level, :, :], v_wind[ind_level, :, :] = m2deg(lon, lat, u_wind[ind_level, :, :], v_wind[ind_level, :, :])
+    u_wind, v_wind = m2deg(lon, lat, u_wind, v_wind, inplace=True)
     return {'datetime': dt, 'press': np.array(levels)*100., 'lon': lon, 'lat': lat, # convert levels from hPa to Pa
             'surface_pressure': surface_pressure, 'surface_altitude': surface_altitude, 
             'altitude': altitude, 'u_wind_deg': u_wind, 'v_wind_deg': v_wind,
@@ -146,11 +147,11 @@ def readGfsDataFiles(filelist):
                     'press': this_data['press'],
                     'lon': this_data['lon'],
                     'lat': this_data['lat'],
-                    'surface_pressure': np.zeros((len(filelist),len(this_data['lon']),len(this_data['lat']))),
-                    'surface_altitude': np.zeros((len(filelist),len(this_data['lon']),len(this_data['lat']))),
-                    'altitude': np.zeros((len(filelist),len(this_data['press']),len(this_data['lon']),len(this_data['lat']))),
-                    'u_wind_deg': np.zeros((len(filelist),len(this_data['press']),len(this_data['lon']),len(this_data['lat']))),
-                    'v_wind_deg': np.zeros((len(filelist),len(this_data['press']),len(this_data['lon']),len(this_data['lat']))),
+                    'surface_pressure': np.zeros((len(filelist),len(this_data['lat']),len(this_data['lon']))),
+                    'surface_altitude': np.zeros((len(filelist),len(this_data['lat']),len(this_data['lon']))),
+                    'altitude': np.zeros((len(filelist),len(this_data['press']),len(this_data['lat']),len(this_data['lon'])), dtype=np.float32),
+                    'u_wind_deg': np.zeros((len(filelist),len(this_data['press']),len(this_data['lat']),len(this_data['lon'])), dtype=np.float32),
+                    'v_wind_deg': np.zeros((len(filelist),len(this_data['press']),len(this_data['lat']),len(this_data['lon'])), dtype=np.float32),
                     'proj': None, 'lev_type': 'press',
                     'model_name': 'GFS'}
         data['datetime'][ind_file] = this_data['datetime']
@@ -275,6 +276,14 @@ readModelData = {
         'GFS': readGfsDataFiles,
         'HARMONIE': readHarmonieDataFiles}
 
+"""
+Factor by which the time step of the ascent integration is enlarged. The ascent
+is integrated with the midpoint method, which is more accurate with five times
+the time step than the Euler method with the original one. The trajectory is
+then interpolated to the original time step.
+"""
+ascent_step_factor = 5
+
 
 def equidistantAltitudeGrid(start_datetime, start_altitude, end_altitude, ascent_velocity, timestep):
     """
@@ -289,16 +298,122 @@ def equidistantAltitudeGrid(start_datetime, start_altitude, end_altitude, ascent
     @return altitude_vector altitude vector of the grid
     """
     duration = (end_altitude - start_altitude) / ascent_velocity # in s
-    top_datetime = start_datetime + datetime.timedelta(seconds=duration)
-    datetime_vector = start_datetime + np.array([datetime.timedelta(seconds=seconds) for seconds in np.arange(0, duration, timestep)])
-    altitude_vector = np.arange(start_altitude, end_altitude, ascent_velocity*timestep)
-    assert(len(datetime_vector) == len(altitude_vector))
-    datetime_vector = np.append(datetime_vector, top_datetime)
-    altitude_vector = np.append(altitude_vector, end_altitude)
+    seconds = np.arange(0, duration, timestep)
+    altitudes = np.arange(start_altitude, end_altitude, ascent_velocity*timestep)
+    assert(len(seconds) == len(altitudes))
+    # Allocate the grids including the end point instead of appending it.
+    seconds_vector = np.empty(len(seconds)+1)
+    seconds_vector[:-1] = seconds
+    seconds_vector[-1] = duration
+    altitude_vector = np.empty(len(altitudes)+1)
+    altitude_vector[:-1] = altitudes
+    altitude_vector[-1] = end_altitude
+    # Create the time offsets in NumPy, rounded to microseconds like datetime.timedelta.
+    offsets = np.round(seconds_vector * 1e6).astype('timedelta64[us]').astype(datetime.timedelta)
+    datetime_vector = start_datetime + offsets
     return datetime_vector, altitude_vector
 
 
-def predictTrajectory(dt, altitude, model_data, lon_start, lat_start):
+"""
+Upper bound of surface elevation in m (Mount Everest). The ground is looked
+up only below this altitude.
+"""
+max_surface_elevation = 8849.
+
+
+@functools.lru_cache(maxsize=4096)
+def cachedSurfaceElevation(lat, lon):
+    """
+    Look up surface elevation from SRTM data, caching the result.
+    """
+    return srtm.get_elevation(lat, lon)
+
+
+def surfaceElevation(lat, lon):
+    """
+    Get surface elevation at given position.
+    srtm reads the elevation tile from file on every call, therefore lookups
+    are cached on coordinates rounded to 0.001 degrees, which is about the
+    resolution of the SRTM data.
+
+    @param lat latitude in degrees
+    @param lon longitude in degrees
+
+    @return surface_elevation surface elevation in m, or None if not available
+    """
+    return cachedSurfaceElevation(round(lat, 3), round(lon, 3))
+
+
+def windInterpolator(model_data):
+    """
+    Create the interpolator of the horizontal winds of given model data. It
+    holds a copy of the winds, so create it once and pass it on when predicting
+    several trajectories with the same model data.
+
+    @param model_data model data
+
+    @return interp_uv interpolation.GridInterpolator object giving the winds
+        (u, v) at (time in s since first model time, level, y, x)
+    """
+    if model_data['proj'] is None:
+        x_var = 'lon'
+        y_var = 'lat'
+        u_var = 'u_wind_deg'
+        v_var = 'v_wind_deg'
+    else:
+        x_var = 'x'
+        y_var = 'y'
+        u_var = 'u_wind_ms'
+        v_var = 'v_wind_ms'
+    z_var = 'hybrid' if model_data['lev_type'] == 'hybrid' else 'press'
+    model_start = np.datetime64(model_data['datetime'][0], 'us')
+    time_grid = (np.array(model_data['datetime'], dtype='datetime64[us]') - model_start) / np.timedelta64(1, 's')
+    # Interpolate both wind components in one call, stacked along a trailing axis.
+    return interpolation.GridInterpolator(
+            (time_grid,model_data[z_var],model_data[y_var],model_data[x_var]),
+            np.stack((model_data[u_var], model_data[v_var]), axis=-1))
+
+
+def altitude2levFunction(model_data, lon, lat):
+    """
+    Get a function converting altitudes to model levels, using the model column
+    nearest to given position at the first model time.
+
+    @param model_data model data
+    @param lon longitude in degrees
+    @param lat latitude in degrees
+
+    @return altitude2lev function converting an array of altitudes in m to
+        model levels (pressure in Pa or hybrid level), capped to the model grid
+    """
+    t_start = 0
+    if model_data['proj'] is None:
+        i_start = interpolation.nearestIndex(model_data['lat'], lat)
+        j_start = interpolation.nearestIndex(model_data['lon'], lon)
+    else:
+        x, y = model_data['proj'](lon, lat)
+        i_start = interpolation.nearestIndex(model_data['y'], y)
+        j_start = interpolation.nearestIndex(model_data['x'], x)
+    logging.debug('Start grid point: {}, {}'.format(i_start, j_start))
+    if model_data['lev_type'] == 'hybrid':
+        def altitude2lev(altitude):
+            lev = np.interp(altitude, model_data['altitude'][t_start, :, i_start, j_start][::-1], model_data['hybrid'][::-1])
+            return np.clip(lev, np.min(model_data['hybrid']), np.max(model_data['hybrid']), out=lev)
+    else:
+        # Compute pressure for given altitude array by interpolating log(p) linearly
+        # in the model column near the start position, i.e. piecewise exponentially.
+        column_altitude = model_data['altitude'][t_start, :, i_start, j_start]
+        order = np.argsort(column_altitude)
+        column_altitude = column_altitude[order]
+        column_log_press = np.log(model_data['press'][order])
+        def altitude2lev(altitude):
+            pressure = np.exp(np.interp(altitude, column_altitude, column_log_press))
+            # Cap pressures outside of the model grid to avoid extrapolation.
+            return np.clip(pressure, np.min(model_data['press']), np.max(model_data['press']), out=pressure)
+    return altitude2lev
+
+
+def predictTrajectory(dt, altitude, model_data, lon_start, lat_start, midpoint=False, interp_uv=None):
     """
     Predict balloon trajectory for given altitude array using given model wind data.
 
@@ -307,58 +422,59 @@ def predictTrajectory(dt, altitude, model_data, lon_start, lat_start):
     @param model_data model data
     @param lon_start start longitude in degrees
     @param lat_start start latitude in degrees
+    @param midpoint whether to integrate with the second-order midpoint method
+        instead of the Euler method (default: False). It needs two wind
+        interpolations per time step but allows for considerably larger steps.
+    @param interp_uv wind interpolator of the model data as created by
+        windInterpolator (default: None, create it)
 
     @return gpx_segment gpxpy.gpx.GPXTrackSegment object with trajectory
     """
     gpx_segment = gpxpy.gpx.GPXTrackSegment()
-    t_start = 0
     if model_data['proj'] is None:
-        x_var = 'lat'
-        y_var = 'lon'
-        u_var = 'u_wind_deg'
-        v_var = 'v_wind_deg'
         x = lon_start
         y = lat_start
-        i_start = np.argmin(np.abs(model_data['lon']-lon_start))
-        j_start = np.argmin(np.abs(model_data['lat']-lat_start))
     else:
-        x_var = 'x'
-        y_var = 'y'
-        u_var = 'u_wind_ms'
-        v_var = 'v_wind_ms'
         x, y = model_data['proj'](lon_start, lat_start)
-        i_start = np.argmin(np.abs(model_data['y']-y))
-        j_start = np.argmin(np.abs(model_data['x']-x))
-    print(i_start,j_start) # DEBUG
-    if model_data['lev_type'] == 'hybrid':
-        z_var = 'hybrid'
-        lev = np.interp(altitude, model_data['altitude'][t_start, :, i_start, j_start][::-1], model_data['hybrid'][::-1])
-        max_lev = np.max(model_data['hybrid'])
-        min_lev = np.min(model_data['hybrid'])
-        lev[lev > max_lev] = max_lev
-        lev[lev < min_lev] = min_lev
-    else:
-        z_var = 'press'
-        # Compute pressure for given altitude array by interpolating the model near
-        # the launch position with an exponential fit.
-        expfun = lambda x,a,b: a*np.exp(b*x)
-        popt, pcov = curve_fit(expfun,  model_data['altitude'][t_start, :, i_start, j_start],  model_data['press'],  p0=(model_data['surface_pressure'][t_start, i_start, j_start], -1./8300.))
-        pressure = expfun(altitude, popt[0], popt[1])
-        max_model_press = np.max(model_data['press'])
-        min_model_press = np.min(model_data['press'])
-        pressure[pressure > max_model_press] = max_model_press # Cap pressures larger than maximum of model grid to avoid extrapolation.
-        pressure[pressure < min_model_press] = min_model_press # Cap pressures lower than maximum of model grid to avoid extrapolation.
-        lev = pressure
+    altitude2lev = altitude2levFunction(model_data, lon_start, lat_start)
+    lev = altitude2lev(altitude)
+    pressure = lev
 
     # Displace balloon by model winds.
-    time_grid = np.array([(this_dt-model_data['datetime'][0]).total_seconds() for this_dt in model_data['datetime']])
-    interp_u = RegularGridInterpolator((time_grid,model_data[z_var],model_data[y_var],model_data[x_var]), model_data[u_var])
-    interp_v = RegularGridInterpolator((time_grid,model_data[z_var],model_data[y_var],model_data[x_var]), model_data[v_var])
+    if interp_uv is None:
+        interp_uv = windInterpolator(model_data)
+    time_grid = interp_uv.grid[0]
+    # Convert times to seconds since the first model time once, instead of in every step.
+    model_start = np.datetime64(model_data['datetime'][0], 'us')
+    dt_us = np.array(dt, dtype='datetime64[us]')
+    dt_seconds = ((dt_us - model_start) / np.timedelta64(1, 's')).tolist()
+    delta_t_seconds = [0.] + (np.diff(dt_us) / np.timedelta64(1, 's')).tolist()
+    # The levels along the trajectory are known in advance, locate them in the grid at once.
+    lev_cell, lev_weight = interp_uv.locateAll(1, lev)
+    if midpoint:
+        lev_mid_cell, lev_mid_weight = interp_uv.locateAll(1, altitude2lev((altitude[:-1] + altitude[1:]) / 2.))
+    def windAt(grid_time, ind_lev, weight_lev, x, y):
+        ind_time, weight_time = interp_uv.locate(0, grid_time)
+        ind_y, weight_y = interp_uv.locate(2, y)
+        ind_x, weight_x = interp_uv.locate(3, x)
+        # Convert to Python floats to integrate the position in double precision
+        # also if the model data is in single precision.
+        return interp_uv.evaluate(
+                (ind_time, ind_lev, ind_y, ind_x),
+                (weight_time, weight_lev, weight_y, weight_x)).tolist()
+    grid_time = min(max(dt_seconds[0], time_grid[0]), time_grid[-1])
+    # Collect the trajectory in arrays and create the GPX points after the loop.
+    traj_lon = np.zeros(len(dt))
+    traj_lat = np.zeros(len(dt))
+    traj_datetime = list(dt)
+    is_valid = np.zeros(len(dt), dtype=bool)
     has_landed = False
+    is_descent = altitude[-1] < altitude[0]
     for ind in range(len(dt)):
         if ind > 0:
-            delta_t = (dt[ind] - dt[ind-1]).total_seconds()
-            grid_time = (dt[ind]-model_data['datetime'][0]).total_seconds()
+            delta_t = delta_t_seconds[ind]
+            last_grid_time = grid_time
+            grid_time = dt_seconds[ind]
             if grid_time > time_grid[-1]:
                 grid_time = time_grid[-1] # Cap time outside grid
                 logging.warning('Capping time outside grid: {} > {}'.format(dt[ind], model_data['datetime'][-1]))
@@ -366,20 +482,28 @@ def predictTrajectory(dt, altitude, model_data, lon_start, lat_start):
                 grid_time = time_grid[0] # Cap time outside grid
                 logging.warning('Capping time outside grid: {} < {}'.format(dt[ind], model_data['datetime'][0]))
             try:
-                u = interp_u([grid_time, lev[ind], x, y])[0]
-                v = interp_v([grid_time, lev[ind], x, y])[0]
+                if midpoint:
+                    # Step with the wind at the middle of the time step, estimated with a half Euler step.
+                    u, v = windAt(last_grid_time, lev_cell[ind-1], lev_weight[ind-1], x, y)
+                    u, v = windAt((last_grid_time + grid_time) / 2., lev_mid_cell[ind-1], lev_mid_weight[ind-1],
+                                  x + 0.5 * delta_t * u, y + 0.5 * delta_t * v)
+                else:
+                    u, v = windAt(grid_time, lev_cell[ind], lev_weight[ind], x, y)
             except ValueError as err:
                 logging.error('Error interpolating winds at {}, {}: {}'.format(x, y, err))
                 continue
             x += delta_t * u
             y += delta_t * v
-            if model_data['proj'] is None:
-                lon = x
-                lat = y
+            if is_descent and altitude[ind] <= max_surface_elevation:
+                if model_data['proj'] is None:
+                    lon = x
+                    lat = y
+                else:
+                    lon, lat = model_data['proj'](x, y, inverse=True)
+                surface_elevation = surfaceElevation(lat, lon)
             else:
-                lon, lat = model_data['proj'](x, y, inverse=True)
-            surface_elevation = srtm.get_elevation(lat, lon)
-            if surface_elevation is not None and altitude[-1] < altitude[0] and altitude[ind] <= surface_elevation:
+                surface_elevation = None # The ground cannot be hit, skip the lookup.
+            if surface_elevation is not None and altitude[ind] <= surface_elevation:
                 # Compute after which fraction of the last time step the ground
                 # has been hit, and go back accordingly.
                 # This approach assumes no steep slopes.
@@ -387,23 +511,139 @@ def predictTrajectory(dt, altitude, model_data, lon_start, lat_start):
                 timestep_fraction = below_ground / (altitude[ind] - altitude[ind-1])
                 x -= timestep_fraction * delta_t * u
                 y -= timestep_fraction * delta_t * v
-                dt -= datetime.timedelta(seconds=timestep_fraction*delta_t)
+                traj_datetime[ind] = dt[ind] - datetime.timedelta(seconds=timestep_fraction*delta_t)
                 has_landed = True
         if model_data['proj'] is None:
             lon = x
             lat = y
         else:
             lon, lat = model_data['proj'](x, y, inverse=True)
-        gpx_segment.points.append(gpxpy.gpx.GPXTrackPoint(
-                lat, lon, elevation=altitude[ind], time=dt[ind], 
-                comment=('{:.2f} hPa'.format(pressure[ind]/100.) if model_data['lev_type'] == 'press' else 'lev {:.2f}.format(lev[ind])')))
+        traj_lon[ind] = lon
+        traj_lat[ind] = lat
+        is_valid[ind] = True
         if has_landed:
             break
+    for ind in np.flatnonzero(is_valid):
+        gpx_segment.points.append(gpxpy.gpx.GPXTrackPoint(
+                traj_lat[ind], traj_lon[ind], elevation=altitude[ind], time=traj_datetime[ind],
+                comment=('{:.2f} hPa'.format(pressure[ind]/100.) if model_data['lev_type'] == 'press' else 'lev {:.2f}'.format(lev[ind]))))
     return gpx_segment
 
 
+def predictTrajectoryEnsemble(dt, altitude, model_data, lon_start, lat_start, interp_uv=None):
+    """
+    Predict the trajectories of an ensemble of balloons with the same altitude
+    profile but different start positions, e.g. for Monte Carlo estimates of the
+    landing area. All members are displaced together by vectorized Euler steps,
+    giving the same trajectories as predictTrajectory for each member, except
+    that altitudes are converted to model levels using the model column at the
+    start position of the first member.
+
+    @param dt datetime vector
+    @param altitude altitude vector
+    @param model_data model data
+    @param lon_start array of start longitudes in degrees
+    @param lat_start array of start latitudes in degrees
+    @param interp_uv wind interpolator of the model data as created by
+        windInterpolator (default: None, create it)
+
+    @return gpx_segments list of gpxpy.gpx.GPXTrackSegment objects with the trajectories
+    """
+    lon_start = np.atleast_1d(np.array(lon_start, dtype=float))
+    lat_start = np.atleast_1d(np.array(lat_start, dtype=float))
+    n_members = len(lon_start)
+    if model_data['proj'] is None:
+        x = lon_start.copy()
+        y = lat_start.copy()
+    else:
+        x, y = model_data['proj'](lon_start, lat_start)
+        x = np.array(x, dtype=float)
+        y = np.array(y, dtype=float)
+    lev = altitude2levFunction(model_data, lon_start[0], lat_start[0])(altitude)
+
+    # Displace balloons by model winds.
+    if interp_uv is None:
+        interp_uv = windInterpolator(model_data)
+    time_grid = interp_uv.grid[0]
+    y_grid = interp_uv.grid[2]
+    x_grid = interp_uv.grid[3]
+    # Times and levels are the same for all members, locate them in the grid at once.
+    model_start = np.datetime64(model_data['datetime'][0], 'us')
+    dt_us = np.array(dt, dtype='datetime64[us]')
+    dt_seconds = (dt_us - model_start) / np.timedelta64(1, 's')
+    if dt_seconds.min() < time_grid[0] or dt_seconds.max() > time_grid[-1]:
+        logging.warning('Capping times outside grid {} - {}'.format(model_data['datetime'][0], model_data['datetime'][-1]))
+    time_cell, time_weight = interp_uv.locateAll(0, np.clip(dt_seconds, time_grid[0], time_grid[-1]))
+    delta_t_seconds = np.diff(dt_us) / np.timedelta64(1, 's')
+    lev_cell, lev_weight = interp_uv.locateAll(1, lev)
+    traj_x = np.zeros((len(dt), n_members))
+    traj_y = np.zeros((len(dt), n_members))
+    traj_x[0,:] = x
+    traj_y[0,:] = y
+    is_valid = np.zeros((len(dt), n_members), dtype=bool)
+    is_valid[0,:] = True
+    landing_time_shift = np.zeros(n_members) # seconds between landing and the last time step
+    is_active = np.ones(n_members, dtype=bool)
+    is_descent = altitude[-1] < altitude[0]
+    for ind in range(1, len(dt)):
+        # Members that left the model domain end their trajectory.
+        is_active &= (y >= y_grid[0]) & (y <= y_grid[-1]) & (x >= x_grid[0]) & (x <= x_grid[-1])
+        members = np.flatnonzero(is_active)
+        if len(members) == 0:
+            break
+        ind_y, weight_y = interp_uv.locateAll(2, y[members])
+        ind_x, weight_x = interp_uv.locateAll(3, x[members])
+        uv = interp_uv.evaluateAll(
+                (time_cell[ind], lev_cell[ind], ind_y, ind_x),
+                (time_weight[ind], lev_weight[ind], weight_y, weight_x))
+        delta_t = delta_t_seconds[ind-1]
+        x[members] += delta_t * uv[:,0]
+        y[members] += delta_t * uv[:,1]
+        if is_descent and altitude[ind] <= max_surface_elevation:
+            if model_data['proj'] is None:
+                lon = x[members]
+                lat = y[members]
+            else:
+                lon, lat = model_data['proj'](x[members], y[members], inverse=True)
+            surface_elevation = np.array([surfaceElevation(this_lat, this_lon) for this_lat, this_lon in zip(lat, lon)], dtype=float) # NaN if not available
+            has_landed = altitude[ind] <= surface_elevation
+            if has_landed.any():
+                # Go back by the fraction of the last time step after which the ground has been hit.
+                landed = members[has_landed]
+                timestep_fraction = (surface_elevation[has_landed] - altitude[ind]) / (altitude[ind] - altitude[ind-1])
+                x[landed] -= timestep_fraction * delta_t * uv[has_landed,0]
+                y[landed] -= timestep_fraction * delta_t * uv[has_landed,1]
+                landing_time_shift[landed] = timestep_fraction * delta_t
+                is_active[landed] = False
+        traj_x[ind,members] = x[members]
+        traj_y[ind,members] = y[members]
+        is_valid[ind,members] = True
+    if model_data['proj'] is None:
+        traj_lon = traj_x
+        traj_lat = traj_y
+    else:
+        traj_lon, traj_lat = model_data['proj'](traj_x, traj_y, inverse=True)
+    if model_data['lev_type'] == 'press':
+        comments = ['{:.2f} hPa'.format(this_lev/100.) for this_lev in lev]
+    else:
+        comments = ['lev {:.2f}'.format(this_lev) for this_lev in lev]
+    gpx_segments = []
+    for ind_member in range(n_members):
+        gpx_segment = gpxpy.gpx.GPXTrackSegment()
+        valid = np.flatnonzero(is_valid[:,ind_member])
+        for ind in valid:
+            this_datetime = dt[ind]
+            if ind == valid[-1] and landing_time_shift[ind_member] != 0.:
+                this_datetime = dt[ind] - datetime.timedelta(seconds=landing_time_shift[ind_member])
+            gpx_segment.points.append(gpxpy.gpx.GPXTrackPoint(
+                    traj_lat[ind,ind_member], traj_lon[ind,ind_member], elevation=altitude[ind],
+                    time=this_datetime, comment=comments[ind]))
+        gpx_segments.append(gpx_segment)
+    return gpx_segments
+
+
 def predictAscent(launch_datetime, launch_lon, launch_lat, launch_altitude,
-                  top_height, ascent_velocity, model_data, timestep):
+                  top_height, ascent_velocity, model_data, timestep, interp_uv=None):
     """
     Predict trajectory for balloon ascent.
 
@@ -415,6 +655,8 @@ def predictAscent(launch_datetime, launch_lon, launch_lat, launch_altitude,
     @param ascent_velocity balloon ascent velocity in m/s
     @param model_data model data
     @param timestep time step in s
+    @param interp_uv wind interpolator of the model data as created by
+        windInterpolator (default: None, create it)
 
     @return segment_ascent trajectory as gpxpy.gpx.GPXTrackSegment object
     @return top_lon ceiling longitude in degrees
@@ -422,7 +664,23 @@ def predictAscent(launch_datetime, launch_lon, launch_lat, launch_altitude,
     @return top_datetime ceiling datetime
     """
     datetime_ascent, alt_ascent = equidistantAltitudeGrid(launch_datetime, launch_altitude, top_height, ascent_velocity, timestep)
-    segment_ascent = predictTrajectory(datetime_ascent, alt_ascent, model_data, launch_lon, launch_lat)
+    # Integrate with the midpoint method on a coarser grid, and interpolate the
+    # trajectory to the grid of the configured time step.
+    datetime_coarse, alt_coarse = equidistantAltitudeGrid(launch_datetime, launch_altitude, top_height, ascent_velocity, timestep*ascent_step_factor)
+    segment_coarse = predictTrajectory(datetime_coarse, alt_coarse, model_data, launch_lon, launch_lat, midpoint=True, interp_uv=interp_uv)
+    seconds_coarse = np.array([(point.time - launch_datetime).total_seconds() for point in segment_coarse.points])
+    lon_coarse = np.array([point.longitude for point in segment_coarse.points])
+    lat_coarse = np.array([point.latitude for point in segment_coarse.points])
+    seconds_ascent = ((datetime_ascent - launch_datetime) / datetime.timedelta(seconds=1)).astype(float)
+    is_valid = seconds_ascent <= seconds_coarse[-1] # the coarse trajectory may end early when leaving the model domain
+    lon_ascent = np.interp(seconds_ascent, seconds_coarse, lon_coarse)
+    lat_ascent = np.interp(seconds_ascent, seconds_coarse, lat_coarse)
+    lev_ascent = altitude2levFunction(model_data, launch_lon, launch_lat)(alt_ascent)
+    segment_ascent = gpxpy.gpx.GPXTrackSegment()
+    for ind in np.flatnonzero(is_valid):
+        segment_ascent.points.append(gpxpy.gpx.GPXTrackPoint(
+                lat_ascent[ind], lon_ascent[ind], elevation=alt_ascent[ind], time=datetime_ascent[ind],
+                comment=('{:.2f} hPa'.format(lev_ascent[ind]/100.) if model_data['lev_type'] == 'press' else 'lev {:.2f}'.format(lev_ascent[ind]))))
     top_lon = segment_ascent.points[-1].longitude
     top_lat = segment_ascent.points[-1].latitude
     top_datetime = datetime_ascent[-1]
@@ -432,7 +690,7 @@ def predictAscent(launch_datetime, launch_lon, launch_lat, launch_altitude,
 
 def predictDescent(top_datetime, top_lon, top_lat, top_height, descent_velocity, 
                    parachute_parameters, payload_weight, payload_area, model_data, timestep,
-                   initial_velocity=0.):
+                   initial_velocity=0., interp_uv=None):
     """
     Predict trajectory for balloon descent.
 
@@ -447,6 +705,8 @@ def predictDescent(top_datetime, top_lon, top_lat, top_height, descent_velocity,
     @param model_data model data
     @param timestep time step in s
     @param initial_velocity initial velocity for descent on parachute in m/s
+    @param interp_uv wind interpolator of the model data as created by
+        windInterpolator (default: None, create it)
 
     @return segment_descent trajectory as gpxpy.gpx.GPXTrackSegment object
     @return landing_lon landing longitude in degrees
@@ -457,8 +717,8 @@ def predictDescent(top_datetime, top_lon, top_lat, top_height, descent_velocity,
         datetime_descent, alt_descent = equidistantAltitudeGrid(top_datetime, top_height, 0, -descent_velocity, timestep)
     else:
         time_descent, alt_descent, velocity_descent = parachute.parachuteDescent(top_height, timestep, payload_weight, parachute_parameters, payload_area, initial_velocity=initial_velocity)
-        datetime_descent = top_datetime + np.array([datetime.timedelta(seconds=this_time) for this_time in time_descent])
-    segment_descent = predictTrajectory(datetime_descent, alt_descent, model_data, top_lon, top_lat)
+        datetime_descent = top_datetime + np.round(time_descent * 1e6).astype('timedelta64[us]').astype(datetime.timedelta)
+    segment_descent = predictTrajectory(datetime_descent, alt_descent, model_data, top_lon, top_lat, interp_uv=interp_uv)
     if len(segment_descent.points) > 0:
         landing_lon = segment_descent.points[-1].longitude
         landing_lat = segment_descent.points[-1].latitude
@@ -486,7 +746,7 @@ def predictBalloonFlight(
     @param payload_area payload area in m^2
     @param ascent_velocity desired ascent velocity in m/s
     @param top_height balloon ceiling height in m
-    @param parachute_parameters named array with parachute parameters
+    @param parachute_parameters dictionary with parachute parameters
     @param model_data model data
     @param timestep time step in s
     @param descent_velocity desired descent velocity for descent on balloon (None for descent on parachute)
@@ -497,12 +757,13 @@ def predictBalloonFlight(
 
     track = gpxpy.gpx.GPXTrack()
     waypoints = []
+    interp_uv = windInterpolator(model_data) # shared by ascent and descent
 
     # Compute ascent
     if not descent_only:
         waypoints.append(gpxpy.gpx.GPXWaypoint(
                 launch_lat, launch_lon, elevation=launch_altitude, time=launch_datetime, name='Launch'))
-        segment_ascent, top_lon, top_lat, top_datetime = predictAscent(launch_datetime, launch_lon, launch_lat, launch_altitude, top_height, ascent_velocity, model_data, timestep)
+        segment_ascent, top_lon, top_lat, top_datetime = predictAscent(launch_datetime, launch_lon, launch_lat, launch_altitude, top_height, ascent_velocity, model_data, timestep, interp_uv=interp_uv)
         track.segments.append(segment_ascent)
     else:
         top_lon = launch_lon
@@ -516,7 +777,7 @@ def predictBalloonFlight(
     segment_descent, landing_lon, landing_lat = predictDescent(
             top_datetime, top_lon, top_lat, top_height, descent_velocity,
             parachute_parameters, payload_weight, payload_area, model_data, timestep,
-            initial_velocity=initial_velocity)
+            initial_velocity=initial_velocity, interp_uv=interp_uv)
     track.segments.append(segment_descent)
     waypoints.append(gpxpy.gpx.GPXWaypoint(
             landing_lat, landing_lon, elevation=segment_descent.points[-1].elevation, 
@@ -658,6 +919,7 @@ def doOneLivePrediction(
     track = gpxpy.gpx.GPXTrack()
     track.segments.append(segment_tracked)
     waypoints = [launch_point]
+    interp_uv = windInterpolator(model_data) # shared by all predictions from current location
     if top_point is None: # If balloon is on ascent.
         waypoints.append(message.Message.message2waypoint(msg, name='Current'))
         # Track if balloon is cut now.
@@ -672,7 +934,8 @@ def doOneLivePrediction(
                 payload_weight,
                 payload_area,
                 model_data,
-                timestep)
+                timestep,
+                interp_uv=interp_uv)
         track_cut.segments.append(segment_cut)
         waypoints_cut = deepcopy(waypoints)
         waypoints_cut.append(gpxpy.gpx.GPXWaypoint(
@@ -688,7 +951,8 @@ def doOneLivePrediction(
                 top_altitude,
                 ascent_velocity,
                 model_data,
-                timestep)
+                timestep,
+                interp_uv=interp_uv)
         track.segments.append(segment_ascent)
         waypoints.append(gpxpy.gpx.GPXWaypoint(
                 cur_lat, cur_lon, elevation=top_altitude, time=cur_datetime, name='Ceiling'))
@@ -711,7 +975,8 @@ def doOneLivePrediction(
             payload_area,
             model_data,
             timestep,
-            initial_velocity=initial_descent_velocity)
+            initial_velocity=initial_descent_velocity,
+            interp_uv=interp_uv)
     flight_range = geog.distance(
             [launch_point.longitude, launch_point.latitude],
             [landing_lon, landing_lat]) / 1000.
@@ -775,7 +1040,7 @@ def liveForecast(
     @param payload_area payload area in m^2
     @param ascent_velocity desired ascent velocity in m/s
     @param top_height balloon ceiling height in m
-    @param parachute_parameters named array with parachute parameters
+    @param parachute_parameters dictionary with parachute parameters
     @param timestep time step in s
     @param model_name name of the model to use
     @param model_path directory where model data shall be stored
@@ -841,6 +1106,35 @@ def liveForecast(
     return
 
 
+def predictHourlyFlight(args):
+    """
+    Predict one flight of an hourly forecast. The arguments are passed as one
+    tuple so that the function can be mapped over a process pool.
+
+    @param args tuple (launch_datetime, filelist, model_name, launch_lon,
+        launch_lat, launch_altitude, payload_weight, payload_area,
+        ascent_velocity, top_height, parachute_parameters, timestep,
+        descent_velocity)
+
+    @return flight_track trajectory as gpxpy.gpx.GPXTrack object
+    @return flight_waypoints list of waypoints of the flight
+    """
+    (launch_datetime, filelist, model_name, launch_lon, launch_lat, launch_altitude,
+     payload_weight, payload_area, ascent_velocity, top_height,
+     parachute_parameters, timestep, descent_velocity) = args
+    logging.info('Forecast for launch at {} ...'.format(launch_datetime))
+    model_data = readModelData[model_name.upper()](filelist)
+    flight_track, flight_waypoints, flight_range = predictBalloonFlight(
+        launch_datetime, launch_lon, launch_lat, launch_altitude,
+        payload_weight, payload_area, ascent_velocity, top_height,
+        parachute_parameters, model_data, timestep, 
+        descent_velocity=descent_velocity, 
+        descent_only=False)
+    flight_track.name = 'Launch {}'.format(launch_datetime)
+    flight_track.join(0)
+    return flight_track, flight_waypoints
+
+
 def hourlyForecast(
         launch_datetime, launch_lon, launch_lat, launch_altitude,
         payload_weight, payload_area, ascent_velocity, top_height,
@@ -848,33 +1142,45 @@ def hourlyForecast(
         forecast_length,
         timestep, model_name, model_path, output_file,
         descent_velocity=None,
-        webpage=None, upload=None):
+        webpage=None, upload=None, parallel=False):
     gpx = gpxpy.gpx.GPX()
     gpx.name = 'Hourly forecast'
     gpx.waypoints.append(gpxpy.gpx.GPXWaypoint(
             launch_lat, launch_lon, elevation=launch_altitude,
             name='Launch', description='Launch point'))
     hourly_segment = gpxpy.gpx.GPXTrackSegment()
-    individual_tracks = []
-    individual_waypoints = []
     if launch_datetime is None:
         launch_datetime = utils.roundHours(datetime.datetime.utcnow(), 1) # Round current time up to next full hour.
+    # Download data first, one hour after another, since consecutive hours share files.
+    jobs = []
     for i_hour in range(forecast_length):
         filelist = download_model_data.getModelData(model_name, launch_lon, launch_lat, launch_datetime, model_path)
         if filelist is None or (isinstance(filelist,list) and len(filelist) == 0):
             break
-        logging.info('Forecast for launch at {} ...'.format(launch_datetime))
-        model_data = readModelData[model_name.upper()](filelist)
-        flight_track, flight_waypoints, flight_range = predictBalloonFlight(
-            launch_datetime, launch_lon, launch_lat, launch_altitude,
-            payload_weight, payload_area, ascent_velocity, top_height,
-            parachute_parameters, model_data, timestep, 
-            descent_velocity=descent_velocity, 
-            descent_only=False)
-        flight_track.name = 'Launch {}'.format(launch_datetime)
-        flight_track.join(0)
-        individual_tracks.append(flight_track)
-        individual_waypoints.append(flight_waypoints)
+        jobs.append((launch_datetime, filelist, model_name, launch_lon, launch_lat, launch_altitude,
+                     payload_weight, payload_area, ascent_velocity, top_height,
+                     parachute_parameters, timestep, descent_velocity))
+        launch_datetime += datetime.timedelta(hours=1)
+    # The flights are independent of each other, therefore predict them in parallel
+    # if requested. This is only safe from the command line, not e.g. from a GUI thread.
+    results = None
+    if parallel and len(jobs) > 1:
+        import concurrent.futures
+        try:
+            import multiprocessing
+            # Spawn the worker processes, forking a multithreaded process is unsafe.
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=min(len(jobs), os.cpu_count() or 1),
+                    mp_context=multiprocessing.get_context('spawn')) as executor:
+                results = list(executor.map(predictHourlyFlight, jobs))
+        except (ImportError, NotImplementedError, OSError, concurrent.futures.BrokenExecutor) as err: # e.g. no sem_open on Android
+            logging.warning('Cannot predict in parallel, predicting one launch after another: {}'.format(err))
+    if results is None:
+        results = [predictHourlyFlight(job) for job in jobs]
+    individual_tracks = [result[0] for result in results]
+    individual_waypoints = [result[1] for result in results]
+    for job, flight_track in zip(jobs, individual_tracks):
+        launch_datetime = job[0]
         landing_lon = flight_track.segments[-1].points[-1].longitude
         landing_lat = flight_track.segments[-1].points[-1].latitude
         landing_alt = flight_track.segments[-1].points[-1].elevation
@@ -894,17 +1200,15 @@ def hourlyForecast(
                 landing_lon,
                 elevation=landing_alt,
                 time=launch_datetime))
-        del model_data
-        launch_datetime += datetime.timedelta(hours=1)
-    if i_hour == 0:
+    if len(jobs) == 0:
         logging.error('No forecasts done due to missing data.')
         hourly_track = None
     else:
         hourly_track = gpxpy.gpx.GPXTrack(name='Landing points')
         hourly_track.segments.append(hourly_segment)
         gpx.tracks.append(hourly_track)
-        for ind in range(forecast_length):
-            gpx.tracks.append(individual_tracks[ind])
+        for flight_track in individual_tracks:
+            gpx.tracks.append(flight_track)
         writeGpx(gpx, output_file, upload=upload)
         if webpage:
             createWebpage(individual_tracks, individual_waypoints, webpage, hourly=gpx.waypoints, upload=upload)
@@ -1339,7 +1643,7 @@ def main(launch_datetime, config_file='flight.ini', descent_only=False, hourly=F
             hourly,
             timestep, model, model_path, output_file,
             descent_velocity=descent_velocity,
-            webpage=webpage, upload=upload)
+            webpage=webpage, upload=upload, parallel=True)
 
     else: # Normal trajectory computation.
         # Download and read model data.
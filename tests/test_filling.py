@@ -42,6 +42,17 @@ def test_lookupParameters():
     assert(parameters_800['drag_coefficient'] == 0.3)
 
 
+def test_parameterIndex():
+    """
+    Unit test for parameterIndex
+    """
+    balloon_parameter_list = filling.readBalloonParameterList('totex_balloon_parameters.tsv')
+    balloon_parameter_index = filling.parameterIndex(balloon_parameter_list)
+    assert(len(balloon_parameter_index) == len(balloon_parameter_list['weight']))
+    assert(balloon_parameter_index[800] == filling.lookupParameters(balloon_parameter_list, 800))
+    assert(balloon_parameter_index.get(801) is None)
+
+
 def test_balloonPerformance(verbose=False):
     """
     Unit test for balloonPerformance
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Unit tests for interpolation module.
+
+Copyright (C) 2022 Andreas Schneider <andreas.schneider@fmi.fi>
+
+This file is part of Balloon Operator.
+
+Balloon Operator is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later version.
+
+Balloon Operator is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+Balloon Operator. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+import pytest
+from balloon_operator import interpolation
+
+
+def test_nearestIndex(verbose=False):
+    """
+    Unit test for nearestIndex, comparing with np.argmin
+    """
+    rng = np.random.default_rng(1)
+    for axis in [np.arange(15., 38.25, 0.25), np.arange(72., 62.5, -0.25), np.sort(rng.random(20))]:
+        for x in np.concatenate((rng.uniform(axis.min()-1., axis.max()+1., 100), axis, (axis[1:]+axis[:-1])/2.)):
+            ind = interpolation.nearestIndex(axis, x)
+            if verbose: print(x, ind)
+            assert(ind == np.argmin(np.abs(axis-x)))
+
+
+def test_GridInterpolator(verbose=False):
+    """
+    Unit test for GridInterpolator, comparing with scipy's RegularGridInterpolator
+    """
+    # scipy is only needed for the reference, not by balloon_operator itself.
+    RegularGridInterpolator = pytest.importorskip('scipy.interpolate').RegularGridInterpolator
+    rng = np.random.default_rng(2)
+    grid = (np.array([0., 3600., 7200.]),
+            np.sort(rng.random(8))[::-1]*1e5, # descending like pressure levels
+            np.arange(20., 30., 0.25),
+            np.arange(60., 65., 0.5))
+    values = rng.random((3, 8, 40, 10, 2))
+    interp = interpolation.GridInterpolator(grid, values)
+    interp_scipy = RegularGridInterpolator(grid, values)
+    points = [[rng.uniform(grid[ind].min(), grid[ind].max()) for ind in range(4)] for _ in range(50)]
+    points.append([grid[ind].min() for ind in range(4)]) # lower boundary
+    points.append([grid[ind].max() for ind in range(4)]) # upper boundary
+    for point in points:
+        value = interp(point)
+        if verbose: print(point, value)
+        assert(value.shape == (2,))
+        assert(np.allclose(value, interp_scipy([point])[0], rtol=1e-12, atol=0.))
+    levels = [point[1] for point in points]
+    lev_cell, lev_weight = interp.locateAll(1, levels)
+    for ind, level in enumerate(levels):
+        assert((lev_cell[ind], lev_weight[ind]) == interp.locate(1, level))
+    cells = [interp.locateAll(ind_dim, [point[ind_dim] for point in points]) for ind_dim in range(4)]
+    values = interp.evaluateAll([cell[0] for cell in cells], [cell[1] for cell in cells])
+    assert(values.shape == (len(points), 2))
+    for ind, point in enumerate(points):
+        assert(np.allclose(values[ind], interp(point), rtol=1e-12, atol=0.))
+    values = interp.evaluateAll([cells[0][0][0], cells[1][0][0], cells[2][0], cells[3][0]],
+                                [cells[0][1][0], cells[1][1][0], cells[2][1], cells[3][1]]) # scalars for some dimensions
+    for ind, point in enumerate(points):
+        assert(np.allclose(values[ind], interp([points[0][0], points[0][1], point[2], point[3]]), rtol=1e-12, atol=0.))
+    try:
+        interp([7300., 5e4, 25., 62.])
+        assert False, 'Point out of bounds not detected.'
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_nearestIndex(verbose=True)
+    test_GridInterpolator(verbose=True)
@@ -20,6 +20,7 @@ Balloon Operator. If not, see <https://www.gnu.org/licenses/>.
 """
 
 import datetime
+import gpxpy
 from balloon_operator import message
 
 
@@ -40,5 +41,32 @@ def test_message2point(verbose=False):
         assert(gpx_point.time == datetime.datetime(2021, 5, 7, 10, 23, 25))
 
 
+def test_messages2gpxXml(verbose=False):
+    """
+    Unit test for messages2gpxXml
+    """
+    messages = [{
+            'DATETIME': datetime.datetime(2021, 5, 7, 10, 23, 25),
+            'LAT': 67.3666082, 'LON': 26.6291102, 'ALT': 188.69, 'PRESS': 975}]
+    xml = message.Message.messages2gpxXml(messages, name='Test track')
+    if verbose: print(xml)
+    gpx = gpxpy.parse(xml)
+    assert(gpx.name == 'Test track')
+    gpx_point = gpx.tracks[0].segments[0].points[0]
+    assert(gpx_point.latitude == 67.3666082)
+    assert(gpx_point.longitude == 26.6291102)
+    assert(gpx_point.elevation == 188.69)
+    assert(gpx_point.time == datetime.datetime(2021, 5, 7, 10, 23, 25))
+    assert(gpx_point.comment == '975 hPa')
+    # Timezone-aware times are written in UTC.
+    messages[0]['DATETIME'] = datetime.datetime(2021, 5, 7, 13, 23, 25, tzinfo=datetime.timezone(datetime.timedelta(hours=3)))
+    xml = message.Message.messages2gpxXml(messages)
+    if verbose: print(xml)
+    assert('<time>2021-05-07T10:23:25Z</time>' in xml)
+    gpx_point = gpxpy.parse(xml).tracks[0].segments[0].points[0]
+    assert(gpx_point.time == messages[0]['DATETIME'])
+
+
 if __name__ == "__main__":
     test_message2point(verbose=True)
+    test_messages2gpxXml(verbose=True)
@@ -76,8 +76,93 @@ def test_asc2bin(verbose=False):
     assert(message_sbd.MessageSbd.asc2bin(message_sbd.MessageSbd.bin2asc(msg_bin)) == msg_bin)
 
 
+class FakeImap(object):
+    """
+    Minimal IMAP server mock for testing receiveMessages, with a mailbox of
+    RockBLOCK mails given as list of [uid, attachment, seen] entries.
+    """
+    def __init__(self, mails, uid_validity=b'1'):
+        self.mails = mails
+        self.uid_validity = uid_validity
+    def login(self, user, password):
+        pass
+    def select(self, mailbox):
+        pass
+    def response(self, code):
+        return code, [self.uid_validity]
+    def uid(self, command, *args):
+        if command == 'SEARCH':
+            uids = [mail[0] for mail in self.mails if not mail[2] or '(UNSEEN)' not in args]
+            if args[0] == 'UID':
+                first = int(args[1].split(':')[0])
+                # n:* always matches the highest UID, even if it is below n.
+                uids = [uid for uid in uids if uid >= first or uid == self.mails[-1][0]]
+            return 'OK', [' '.join(str(uid) for uid in uids).encode()]
+        elif command == 'FETCH':
+            uids = [int(uid) for uid in args[0].split(b',')]
+            data = []
+            for mail in self.mails:
+                if mail[0] in uids:
+                    mail[2] = True
+                    data.append(('{} (UID {} RFC822 {{}})'.format(mail[0], mail[0]).encode(), self.rawMail(mail[1])))
+                    data.append(b')')
+            return 'OK', data
+    @staticmethod
+    def rawMail(attachment):
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+        from email.mime.application import MIMEApplication
+        msg = MIMEMultipart()
+        msg.attach(MIMEText('IMEI: 300234010000000\n'))
+        part = MIMEApplication(attachment)
+        part.add_header('Content-Disposition', 'attachment', filename='message.sbd')
+        msg.attach(part)
+        return msg.as_bytes()
+
+
+def test_receiveMessages(verbose=False):
+    """
+    Unit test for receiveMessages with a mocked IMAP server
+    """
+    mails = [[3, b'a', True], [5, b'b', False], [6, b'c', False]]
+    fake_imap = FakeImap(mails)
+    message_handler = message_sbd.MessageSbd(email_host='imap.example.com')
+    imap4_ssl = message_sbd.imaplib.IMAP4_SSL
+    message_sbd.imaplib.IMAP4_SSL = lambda host, ssl_context=None: fake_imap
+    try:
+        message_handler.connect()
+        received = [sbd for imei, sbd in message_handler.receiveMessages()]
+        if verbose: print(received)
+        assert(received == [b'b', b'c'])
+        assert(message_handler.receiveMessages() == [])
+        # New mails are retrieved, mails marked as unseen again are skipped.
+        mails[1][2] = False
+        mails.append([8, b'd', False])
+        received = [sbd for imei, sbd in message_handler.receiveMessages()]
+        if verbose: print(received)
+        assert(received == [b'd'])
+        # A changed UIDVALIDITY resets the UID cursor.
+        mails[0][2] = False
+        fake_imap.uid_validity = b'2'
+        received = [sbd for imei, sbd in message_handler.receiveMessages()]
+        if verbose: print(received)
+        assert(received == [b'a', b'b'])
+        # So does reconnecting.
+        mails[0][2] = False
+        message_handler.connect()
+        received = [sbd for imei, sbd in message_handler.receiveMessages()]
+        if verbose: print(received)
+        assert(received == [b'a'])
+        # All messages are retrieved regardless of the UID cursor.
+        received = [sbd for imei, sbd in message_handler.receiveMessages(unseen_only=False)]
+        assert(received == [b'a', b'b', b'c', b'd'])
+    finally:
+        message_sbd.imaplib.IMAP4_SSL = imap4_ssl
+
+
 if __name__ == "__main__":
     test_checksum(verbose=True)
     test_decodeMessage(verbose=True)
     test_encodeMessage(verbose=True)
     test_asc2bin(verbose=True)
+    test_receiveMessages(verbose=True)
@@ -19,6 +19,7 @@ You should have received a copy of the GNU General Public License along with
 Balloon Operator. If not, see <https://www.gnu.org/licenses/>.
 """
 
+import math
 import numpy as np
 from balloon_operator import parachute
 
@@ -76,6 +77,107 @@ def test_parachuteDescent(verbose=False, plot=False):
     assert(np.abs(eps_alt)[:-25] < eps_limit).all()
 
 
+def test_parachuteDescentFreeFall(verbose=False):
+    """
+    Unit test for parachuteDescent without drag, comparing with free fall.
+    """
+    parachute_parameters = {'name': 'None', 'diameter': 0., 'drag_coefficient': 0.}
+    time, altitude, velocity = parachute.parachuteDescent(1000., 1, 1., parachute_parameters, 0.)
+    if verbose: print(time[-1], altitude[-1], velocity[-1])
+    assert(np.allclose(altitude, 1000. - 9.81/2.*time**2))
+    assert(np.allclose(velocity, -9.81*time))
+
+
+def rungeKuttaDescent(alt_start, timestep, payload_weight, parachute_parameters, payload_area, payload_drag_coefficient=0.25):
+    """
+    Reference descent integrated with the plain Runge-Kutta method throughout,
+    as parachuteDescent did before the terminal velocity shortcut.
+    """
+    delt = .2
+    g = 9.81
+    H = 248.6*287/g
+    drag_factor = 1/(2*payload_weight)*1.225*(
+            parachute_parameters['drag_coefficient']*math.pi*parachute_parameters['diameter']**2/4.
+            + payload_drag_coefficient*payload_area)
+    def acceleration(z, s):
+        return -g + drag_factor*math.exp(-z/H)*s*s
+    t = 0.
+    z = alt_start
+    s = 0.
+    time = []
+    altitude = []
+    velocity = []
+    while z >= 0:
+        time.append(t)
+        altitude.append(z)
+        velocity.append(s)
+        k1z = s
+        k1s = acceleration(z, s)
+        k2z = s+delt/2*k1s
+        k2s = acceleration(z+delt/2*k1z, k2z)
+        k3z = s+delt/2*k2s
+        k3s = acceleration(z+delt/2*k2z, k3z)
+        k4z = s+delt*k3s
+        k4s = acceleration(z+delt*k3z, k4z)
+        z = z+delt/6*(k1z+2*k2z+2*k3z+k4z)
+        s = s+delt/6*(k1s+2*k2s+2*k3s+k4s)
+        t = t+delt
+    downsampling_factor = int(np.round(timestep/delt))
+    indices = list(range(0, len(time), downsampling_factor))
+    if indices[-1] != len(time)-1:
+        indices.append(len(time)-1)
+    return np.array(time)[indices], np.array(altitude)[indices], np.array(velocity)[indices]
+
+
+def checkAgainstRungeKutta(payload_weight, parachute_parameters, payload_area, verbose=False):
+    """
+    Check parachuteDescent from 30 km against the plain Runge-Kutta reference.
+    The velocity may jump by about 1 % when the terminal velocity is reached.
+    """
+    time, altitude, velocity = parachute.parachuteDescent(30000., 10, payload_weight, parachute_parameters, payload_area)
+    ref_time, ref_altitude, ref_velocity = rungeKuttaDescent(30000., 10, payload_weight, parachute_parameters, payload_area)
+    if verbose:
+        print('Maximum difference: {:.3f} m, {:.3f} m/s'.format(
+                np.max(np.abs(altitude - ref_altitude)), np.max(np.abs(velocity - ref_velocity))))
+    assert(len(time) == len(ref_time))
+    assert(np.allclose(time, ref_time, rtol=0., atol=1e-6))
+    assert(np.allclose(altitude, ref_altitude, rtol=0., atol=2.))
+    assert(np.allclose(velocity, ref_velocity, rtol=0.02, atol=0.02))
+
+
+def test_parachuteDescentPayloadDrag(verbose=False):
+    """
+    Unit test for parachuteDescent with payload drag only, where the payload
+    does not reach the terminal velocity in the thin upper atmosphere.
+    """
+    parachute_parameters = {'name': 'None', 'diameter': 0., 'drag_coefficient': 0.}
+    checkAgainstRungeKutta(5., parachute_parameters, 0.15, verbose=verbose)
+
+
+def test_parachuteDescentSmallParachute(verbose=False):
+    """
+    Unit test for parachuteDescent with a small parachute.
+    """
+    parachute_parameters = {'name': 'Small', 'diameter': 0.3, 'drag_coefficient': 1.5}
+    checkAgainstRungeKutta(2., parachute_parameters, 0.07, verbose=verbose)
+
+
+def test_parachuteDescentCache():
+    """
+    Unit test for caching of parachuteDescent
+    """
+    parachute_parameters = {'name': 'Totex large', 'diameter': 3.9, 'drag_coefficient': 1.5}
+    time, altitude, velocity = parachute.parachuteDescent(10000., 10, 5., parachute_parameters, 0.07)
+    time_2, altitude_2, velocity_2 = parachute.parachuteDescent(np.float64(10000.), 10, 5., parachute_parameters, 0.07)
+    assert(altitude_2 is altitude)
+    assert(not altitude.flags.writeable)
+    assert(time.flags.c_contiguous and altitude.flags.c_contiguous and velocity.flags.c_contiguous)
+
+
 if __name__ == "__main__":
     test_lookupParachuteParameters(verbose=True)
     test_parachuteDescent(verbose=True, plot=False)
+    test_parachuteDescentFreeFall(verbose=True)
+    test_parachuteDescentPayloadDrag(verbose=True)
+    test_parachuteDescentSmallParachute(verbose=True)
+    test_parachuteDescentCache()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Unit tests for payloadwidget_wifvos module.
+
+Copyright (C) 2021 Andreas Schneider <andreas.schneider@fmi.fi>
+
+This file is part of Balloon Operator.
+
+Balloon Operator is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later version.
+
+Balloon Operator is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+Balloon Operator. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+from balloon_operator.payloadwidget_wifvos import PayloadWidgetWifvos
+
+
+def test_parseUserval5(verbose=False):
+    """
+    Unit test for parseUserval5
+    """
+    closed = '- - - - - - - - - - - -'
+    expected_valve_text = {
+            0x00000000: (closed, closed),
+            0x00010003: ('o o - - - - - - - - - -', 'o - - - - - - - - - - -'),
+            0x08000800: ('- - - - - - - - - - - o', '- - - - - - - - - - - o'),
+            0x0000f0a5: ('o - o - - o - o - - - -', closed), # bits above 11 are ignored
+            0xffffffff: ('o o o o o o o o o o o o', 'o o o o o o o o o o o o')}
+    for userval5, expected in expected_valve_text.items():
+        valve_text = PayloadWidgetWifvos.parseUserval5(userval5)
+        if verbose: print('{:08x}: {}'.format(userval5, valve_text))
+        assert(valve_text == expected)
+
+
+def test_parseUserval5Batch(verbose=False):
+    """
+    Unit test for parseUserval5Batch, comparing with parseUserval5
+    """
+    rng = np.random.default_rng(5)
+    userval5 = np.concatenate((
+            [0, 1, 0x800, 0xfff, 0x1000, 0xffff, 0x10000, 0x8000000, 0xfff0fff, 0xffffffff], # edge values
+            rng.integers(0, 2**32, 1000)))
+    valve_text = PayloadWidgetWifvos.parseUserval5Batch(userval5)
+    assert(valve_text.shape == (len(userval5), 2))
+    for ind in range(len(userval5)):
+        if verbose: print('{:08x}: {}'.format(userval5[ind], valve_text[ind]))
+        assert(tuple(valve_text[ind]) == PayloadWidgetWifvos.parseUserval5(int(userval5[ind])))
+    assert(PayloadWidgetWifvos.parseUserval5Batch([]).shape == (0, 2))
+
+
+if __name__ == "__main__":
+    test_parseUserval5(verbose=True)
+    test_parseUserval5Batch(verbose=True)
@@ -61,17 +61,51 @@ def fakeGfsData(lon_range, lat_range, datetime_list, model_resolution=0.25, alt=
             'press': pressure_levels,
             'lon': lon_grid,
             'lat': lat_grid,
-            'surface_pressure': surface_pressure * np.ones((len(datetime_list),len(lon_grid),len(lat_grid))),
-            'surface_altitude': alt * np.ones((len(datetime_list),len(lon_grid),len(lat_grid))),
+            'surface_pressure': surface_pressure * np.ones((len(datetime_list),len(lat_grid),len(lon_grid))),
+            'surface_altitude': alt * np.ones((len(datetime_list),len(lat_grid),len(lon_grid))),
             'altitude': np.tile(
                     altitudes.reshape((1,len(altitudes),1,1)),
-                    (len(datetime_list),1,len(lon_grid),len(lat_grid)) ),
-            'u_wind_deg': u * np.ones((len(datetime_list),len(pressure_levels),len(lon_grid),len(lat_grid))),
-            'v_wind_deg': v * np.ones((len(datetime_list),len(pressure_levels),len(lon_grid),len(lat_grid))),
+                    (len(datetime_list),1,len(lat_grid),len(lon_grid)) ),
+            'u_wind_deg': u * np.ones((len(datetime_list),len(pressure_levels),len(lat_grid),len(lon_grid))),
+            'v_wind_deg': v * np.ones((len(datetime_list),len(pressure_levels),len(lat_grid),len(lon_grid))),
             'proj': None, 'lev_type': 'press'}
     return data
 
 
+def fakeHarmonieData(lon0, lat0, datetime_list, nx=101, ny=41, resolution=10000., alt=so_launch_alt):
+    """
+    Create fake HARMONIE model data on a non-square grid in a Lambert conformal
+    projection around given position, with winds u = 5 m/s + 1e-5/s * (y - y0)
+    and v = 0 m/s, where y0 is the y coordinate of the position.
+
+    @param lon0 longitude of grid centre in degrees
+    @param lat0 latitude of grid centre in degrees
+    @param datetime_list list of datetimes
+    @param nx number of grid points in x direction (default: 101)
+    @param ny number of grid points in y direction (default: 41)
+    @param resolution grid resolution in m (default: 10000.)
+    @param alt surface altitude in metres
+    """
+    import pyproj
+    proj = pyproj.Proj('+proj=lcc +lon_0=15 +lat_0=63.3 +lat_1=63.3 +lat_2=63.3 +R=6371000')
+    x0, y0 = proj(lon0, lat0)
+    x_grid = x0 + (np.arange(nx) - nx//2) * resolution
+    y_grid = y0 + (np.arange(ny) - ny//2) * resolution
+    hybrid = np.arange(1., 21.)
+    altitudes = np.linspace(32000., 0., len(hybrid)) + alt
+    shape = (len(datetime_list), len(hybrid), len(y_grid), len(x_grid))
+    data = {'datetime': datetime_list,
+            'x': x_grid,
+            'y': y_grid,
+            'hybrid': hybrid,
+            'altitude': np.broadcast_to(altitudes.reshape((1,len(hybrid),1,1)), shape),
+            'u_wind_ms': np.broadcast_to((5. + 1e-5*(y_grid - y0)).reshape((1,1,len(y_grid),1)), shape),
+            'v_wind_ms': np.zeros(shape),
+            'proj': proj, 'lev_type': 'hybrid',
+            'model_name': 'HARMONIE'}
+    return data
+
+
 def soFakeModelData(alt=so_launch_alt, u=0., v=0.):
     """
     Create fake model data for Sodankylä launch site
@@ -83,7 +117,7 @@ def soFakeModelData(alt=so_launch_alt, u=0., v=0.):
     return model_data
 
 
-def predictTrajectoryTest(lon0, lat0, alt0, alt1, u, v, vertical_velocity=vertical_velocity, verbose=False):
+def predictTrajectoryTest(lon0, lat0, alt0, alt1, u, v, vertical_velocity=vertical_velocity, midpoint=False, verbose=False):
     """
     Perform one test of predictTrajectory with artificial data.
     """
@@ -92,8 +126,10 @@ def predictTrajectoryTest(lon0, lat0, alt0, alt1, u, v, vertical_velocity=vertic
             model_data['datetime'][0], alt0, alt1, vertical_velocity, timestep)
     expected_lon = lon0 if u==0. else np.arange(lon0, lon0+u*timestep*len(alt)-u, u*timestep)
     expected_lat = lat0 if v==0. else np.arange(lat0, lat0+v*timestep*len(alt)-v, v*timestep)
+    model_keys = set(model_data.keys())
     gpx_segment = trajectory_predictor.predictTrajectory(
-            dt, alt, model_data, lon0, lat0)
+            dt, alt, model_data, lon0, lat0, midpoint=midpoint)
+    assert(set(model_data.keys()) == model_keys), 'predictTrajectory modified the model data'
     if verbose:
         print('Number of points: {} / {}'.format(len(alt), len(gpx_segment.points)))
     elev = np.array([point.elevation for point in gpx_segment.points])
@@ -121,6 +157,79 @@ def test_predictTrajectory(verbose=False):
     # Test with unit winds.
     predictTrajectoryTest(25., 63., 0., top_height, 0., 0.001, vertical_velocity=vertical_velocity, verbose=verbose)
     predictTrajectoryTest(20., 67., 0., top_height, 0.001, 0., vertical_velocity=vertical_velocity, verbose=verbose)
+    predictTrajectoryTest(20., 67., 0., top_height, 0.001, 0.0005, vertical_velocity=vertical_velocity, midpoint=True, verbose=verbose)
+
+
+def test_predictTrajectoryHarmonie(verbose=False):
+    """
+    Unit test for predictTrajectory with fake HARMONIE data on a non-square
+    projected grid, where the wind depends on y only, to detect swapped axes.
+    """
+    lon0 = 25.
+    lat0 = 67.
+    dt0 = utils.roundHours(datetime.datetime.utcnow(), 1)
+    model_data = fakeHarmonieData(lon0, lat0, [dt0 + n*datetime.timedelta(hours=1) for n in range(3)])
+    dt, alt = trajectory_predictor.equidistantAltitudeGrid(dt0, so_launch_alt, top_height, vertical_velocity, timestep)
+    gpx_segment = trajectory_predictor.predictTrajectory(dt, alt, model_data, lon0, lat0)
+    assert(len(gpx_segment.points) == len(alt))
+    # The balloon moves along x with 5 m/s and keeps its y coordinate.
+    x0, y0 = model_data['proj'](lon0, lat0)
+    seconds = np.array([(point.time - dt0).total_seconds() for point in gpx_segment.points])
+    expected_lon, expected_lat = model_data['proj'](x0 + 5.*seconds, y0*np.ones(len(seconds)), inverse=True)
+    lon = np.array([point.longitude for point in gpx_segment.points])
+    lat = np.array([point.latitude for point in gpx_segment.points])
+    if verbose:
+        print('Maximum difference: {} / {}'.format(np.max(np.abs(lon - expected_lon)), np.max(np.abs(lat - expected_lat))))
+    assert(np.allclose(lon, expected_lon, rtol=0., atol=1e-8))
+    assert(np.allclose(lat, expected_lat, rtol=0., atol=1e-8))
+
+
+def test_predictAscent(verbose=False):
+    """
+    Unit test for predictAscent, checking that the trajectory is returned on the
+    grid of the configured time step.
+    """
+    model_data = soFakeModelData(u=0.001, v=0.0005)
+    launch_datetime = model_data['datetime'][0]
+    segment_ascent, top_lon, top_lat, top_datetime = trajectory_predictor.predictAscent(
+            launch_datetime, 20., 67., so_launch_alt, top_height, vertical_velocity, model_data, timestep)
+    dt, alt = trajectory_predictor.equidistantAltitudeGrid(
+            launch_datetime, so_launch_alt, top_height, vertical_velocity, timestep)
+    expected = trajectory_predictor.predictTrajectory(dt, alt, model_data, 20., 67.)
+    if verbose:
+        print('Number of points: {} / {}'.format(len(expected.points), len(segment_ascent.points)))
+    assert(len(segment_ascent.points) == len(expected.points))
+    for point, expected_point in zip(segment_ascent.points, expected.points):
+        assert(np.abs(point.longitude - expected_point.longitude) < 1e-10)
+        assert(np.abs(point.latitude - expected_point.latitude) < 1e-10)
+        assert(point.elevation == expected_point.elevation)
+        assert(point.time == expected_point.time)
+        assert(point.comment == expected_point.comment)
+    assert(top_lon == segment_ascent.points[-1].longitude and top_lat == segment_ascent.points[-1].latitude)
+
+
+def test_predictTrajectoryEnsemble(verbose=False):
+    """
+    Unit test for predictTrajectoryEnsemble, comparing with predictTrajectory.
+    """
+    model_data = soFakeModelData(u=0.001, v=0.0005)
+    dt, alt = trajectory_predictor.equidistantAltitudeGrid(
+            model_data['datetime'][0], so_launch_alt, top_height, vertical_velocity, timestep)
+    lon_start = np.array([20., 22.5, 25.])
+    lat_start = np.array([66., 67., 67.5])
+    gpx_segments = trajectory_predictor.predictTrajectoryEnsemble(
+            dt, alt, model_data, lon_start, lat_start)
+    assert(len(gpx_segments) == len(lon_start))
+    for lon0, lat0, gpx_segment in zip(lon_start, lat_start, gpx_segments):
+        expected = trajectory_predictor.predictTrajectory(dt, alt, model_data, lon0, lat0)
+        if verbose:
+            print('Number of points: {} / {}'.format(len(expected.points), len(gpx_segment.points)))
+        assert(len(gpx_segment.points) == len(expected.points))
+        for point, expected_point in zip(gpx_segment.points, expected.points):
+            assert(np.abs(point.longitude - expected_point.longitude) < 1e-10)
+            assert(np.abs(point.latitude - expected_point.latitude) < 1e-10)
+            assert(point.elevation == expected_point.elevation)
+            assert(point.time == expected_point.time)
 
 
 def test_readGfsDataFiles(verbose=False):
@@ -192,5 +301,8 @@ if __name__ == "__main__":
     test_readGfsDataFiles(verbose=True)
     test_equidistantAltitudeGrid(verbose=True)
     test_predictTrajectory(verbose=True)
+    test_predictTrajectoryHarmonie(verbose=True)
+    test_predictAscent(verbose=True)
+    test_predictTrajectoryEnsemble(verbose=True)
     test_checkBorderCrossing(verbose=True)
     test_main()